@@ -5,58 +5,54 @@ Serienblätter je Kreditor aus mock.xlsx - Verbesserte Version mit Fehlerbehandl
 
 import re
 import sys
+import argparse
 from pathlib import Path
 import traceback
 
-print("=== SCHULDENRUF VERFÜGUNG GENERATOR ===")
-print(f"Python Version: {sys.version}")
-print()
-
-try:
-    import pandas as pd
-    from openpyxl import load_workbook
-    from openpyxl.utils import get_column_letter
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    from openpyxl.worksheet.page import PageMargins
-    from openpyxl.worksheet.pagebreak import Break
-    print("✓ Alle Module erfolgreich importiert")
-except ImportError as e:
-    print(f"✗ FEHLER beim Importieren der Module: {e}")
-    print("Installieren Sie fehlende Module mit: pip install pandas openpyxl")
-    sys.exit(1)
-
-# === Basispfade ===
-BASE_DIR = Path(r"C:\Users\peno\Beilagebrief\Beilage-Massenbrief")  ### HIER MUSS EIGENER PFAD GEWÄHLT WERDEN ###
+# === Basispfade (Standard: Projektordner, per Kommandozeile überschreibbar) ===
+BASE_DIR = Path(__file__).resolve().parent
 INPUT_XLSX = BASE_DIR / "mock.xlsx"
 TEMPLATE_XLSX = BASE_DIR / "Beilage Verfuegung.xlsx"
 OUTPUT_XLSX = BASE_DIR / "Beilage_Verfuegung_per_Kreditor.xlsx"
 
-print(f"Arbeitsverzeichnis: {BASE_DIR}")
-print(f"Eingabedatei: {INPUT_XLSX}")
-print(f"Vorlage: {TEMPLATE_XLSX}")
-print(f"Ausgabedatei: {OUTPUT_XLSX}")
-print()
-
-# === Dateien prüfen ===
-if not BASE_DIR.exists():
-    print(f"✗ FEHLER: Basisverzeichnis nicht gefunden: {BASE_DIR}")
-    sys.exit(1)
-else:
-    print(f"✓ Basisverzeichnis gefunden")
-
-if not INPUT_XLSX.exists():
-    print(f"✗ FEHLER: Eingabedatei nicht gefunden: {INPUT_XLSX}")
-    sys.exit(1)
-else:
-    print(f"✓ Eingabedatei gefunden ({INPUT_XLSX.stat().st_size} Bytes)")
-
-if not TEMPLATE_XLSX.exists():
-    print(f"✗ FEHLER: Vorlage nicht gefunden: {TEMPLATE_XLSX}")
-    sys.exit(1)
-else:
-    print(f"✓ Vorlage gefunden ({TEMPLATE_XLSX.stat().st_size} Bytes)")
-
-print()
+def import_modules():
+    """Importiert pandas/openpyxl erst beim Start der Verarbeitung (nicht beim Modul-Import)"""
+    global pd, load_workbook, get_column_letter, Font, Alignment, Border, Side, PatternFill, PageMargins, Break
+    try:
+        import pandas as pd
+        from openpyxl import load_workbook
+        from openpyxl.utils import get_column_letter
+        from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+        from openpyxl.worksheet.page import PageMargins
+        from openpyxl.worksheet.pagebreak import Break
+        print("✓ Alle Module erfolgreich importiert")
+        return True
+    except ImportError as e:
+        print(f"✗ FEHLER beim Importieren der Module: {e}")
+        print("Installieren Sie fehlende Module mit: pip install pandas openpyxl")
+        return False
+
+def check_files():
+    """Prüft Eingabedatei und Vorlage"""
+    print(f"Eingabedatei: {INPUT_XLSX}")
+    print(f"Vorlage: {TEMPLATE_XLSX}")
+    print(f"Ausgabedatei: {OUTPUT_XLSX}")
+    print()
+
+    if not INPUT_XLSX.exists():
+        print(f"✗ FEHLER: Eingabedatei nicht gefunden: {INPUT_XLSX}")
+        return False
+    else:
+        print(f"✓ Eingabedatei gefunden ({INPUT_XLSX.stat().st_size} Bytes)")
+
+    if not TEMPLATE_XLSX.exists():
+        print(f"✗ FEHLER: Vorlage nicht gefunden: {TEMPLATE_XLSX}")
+        return False
+    else:
+        print(f"✓ Vorlage gefunden ({TEMPLATE_XLSX.stat().st_size} Bytes)")
+
+    print()
+    return True
 
 # Rest des ursprünglichen Codes (Konstanten)
 COL_SUP_CODE = "ithSupplierCode"
@@ -362,6 +358,19 @@ def main():
         return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Erzeugt die Beilagen je Kreditor (NA14-Variante).")
+    parser.add_argument("--input", type=Path, default=INPUT_XLSX, help="Eingabedatei")
+    parser.add_argument("--template", type=Path, default=TEMPLATE_XLSX, help="Vorlage")
+    parser.add_argument("--output", type=Path, default=OUTPUT_XLSX, help="Ausgabedatei")
+    args = parser.parse_args()
+    INPUT_XLSX, TEMPLATE_XLSX, OUTPUT_XLSX = args.input, args.template, args.output
+
+    print("=== SCHULDENRUF VERFÜGUNG GENERATOR ===")
+    print(f"Python Version: {sys.version}")
+    print()
+    if not import_modules() or not check_files():
+        sys.exit(1)
+
     try:
         success = main()
         if success:
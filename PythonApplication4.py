@@ -2,22 +2,34 @@
 """
 Serienblätter je Kreditor aus mock.xlsx
 nutzt Vorlage 'Beilage Verfuegung.xlsx' und erzeugt 'Beilage_Verfuegung_per_Kreditor.xlsx'
+
+Aufruf:
+    python PythonApplication4.py [generate] [--input ...] [--template ...] [--output ...]
+    python PythonApplication4.py check [--input ...] [--template ...]
+    python PythonApplication4.py compare ALT.xlsx NEU.xlsx
+
+pandas und openpyxl werden erst in den Stufen importiert, die sie brauchen;
+der Import dieses Moduls hat keine Seiteneffekte.
 """
 
+import contextlib
 import re
+import sys
+import argparse
 from pathlib import Path
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl.worksheet.page import PageMargins
-from openpyxl.worksheet.pagebreak import Break
-
-# === Basispfade ===
-BASE_DIR = Path(r"C:\Users\peno\Beilagebrief\Beilage-Massenbrief")  ### HIER MUSS EIGENER PFAD GEWÄHLT WERDEN ###
+
+from progress_events import ProgressReporter, ConsoleSink, JsonLinesSink
+from shared_strings import StringPool, share_strings
+from checkpoint import Checkpoint, file_fingerprint, run_fingerprint
+from reproducible import make_reproducible
+from input_adapters import input_format, na15_path, read_columns, read_frame
+
+# === Basispfade (Standard: Projektordner, per Kommandozeile überschreibbar) ===
+BASE_DIR = Path(__file__).resolve().parent
 INPUT_XLSX    = BASE_DIR / "mock.xlsx"
 TEMPLATE_XLSX = BASE_DIR / "Beilage Verfuegung.xlsx"
 OUTPUT_XLSX   = BASE_DIR / "Beilage_Verfuegung_per_Kreditor.xlsx"
+OUTPUT_PDF    = BASE_DIR / "Beilage_Verfuegung_per_Kreditor.pdf"
 
 # === Spalten in mock.xlsx ===
 COL_SUP_CODE = "ithSupplierCode"
@@ -30,6 +42,10 @@ COL_CC       = "itlCostCentreCode1"
 COL_CODE     = "Code"
 COL_REASON   = "Begründung"
 
+# Pflichtspalten der Kontierung und des NA15-Registers
+REQUIRED_COLUMNS = [COL_SUP_CODE, COL_SUP_NAME, COL_SUP_EXT, COL_ER, COL_AMOUNT, COL_CC, COL_CODE, COL_REASON]
+NA15_COLUMNS = ["ER", "Name", "Kommentar Begründung"]
+
 # === Helper
 def norm_er(x) -> str:
     """Normalize ER to digits only, so 959168.0 -> '959168' and '  0959-168 ' -> '0959168'."""
@@ -42,20 +58,25 @@ NA15_SHEET_NAME = "NA15 Begründungen"
 
 # === NA15: aus separates Register lesen und indizieren ===
 def load_na15_index_exact(xlsx_path: Path, sheet_name: str = "NA15 Begründungen"):
-    df = pd.read_excel(xlsx_path, engine="openpyxl", sheet_name=sheet_name, header=1)
+    """NA15-Register aus dem Blatt sheet_name (XLSX) bzw. der Datei xlsx_path (CSV/Parquet)"""
+    df = read_frame(xlsx_path, sheet_name=sheet_name, header=1, columns=NA15_COLUMNS)
+    where = f"Blatt '{sheet_name}'" if input_format(xlsx_path) == "xlsx" else f"NA15-Register {Path(xlsx_path).name}"
+    return na15_index_from_frame(df, where)
 
-    need = ["ER", "Name", "Kommentar Begründung"]
-    missing = [c for c in need if c not in df.columns]
+def na15_index_from_frame(df, where="NA15-Register"):
+    """Index (Name, normalisierte ER) -> Begründungen aus einem NA15-Register als DataFrame"""
+    missing = [c for c in NA15_COLUMNS if c not in df.columns]
     if missing:
-        raise ValueError(f"Im Blatt '{sheet_name}' fehlen Spalten: {missing}")
+        raise ValueError(f"Im {where} fehlen Spalten: {missing}")
 
     df = df[df["Kommentar Begründung"].astype(str).str.strip() != ""].copy()
 
     index = {}
+    pool = StringPool()                           # Standardtexte nur einmal im Speicher
     for _, row in df.iterrows():
         name = str(row["Name"]).strip()
         er   = norm_er(row["ER"])                 # <-- normalize here
-        reason = str(row["Kommentar Begründung"]).strip()
+        reason = pool(str(row["Kommentar Begründung"]).strip())
         if name and er and reason:
             index.setdefault((name, er), []).append(reason)
     return index
@@ -100,31 +121,34 @@ def safe_sheet_name(name: str) -> str:
     name = name.strip()
     return name[:31] or "Sheet"
 
+# === Seitenlayout (gilt für Excel-Blätter und PDF-Ausgabe) ===
+PAGE_MARGINS = {"left": 0.7, "right": 0.7, "top": 0.75, "bottom": 1.0, "header": 0.3, "footer": 0.5}  # Zoll
+FOOTER_SIZE = 10
+COLUMN_WIDTHS = {'A': 18, 'B': 12, 'C': 15, 'D': 18, 'E': 12, 'F': 25, 'G': 15}   # Zeichen
+
 def setup_page_formatting(ws):
     """Setzt die Seitenformatierung für A4 Querformat mit Fusszeile"""
+    from openpyxl.worksheet.page import PageMargins
+
     ws.page_setup.orientation = ws.ORIENTATION_LANDSCAPE
     ws.page_setup.paperSize = ws.PAPERSIZE_A4
     ws.page_setup.fitToWidth = 1
     ws.page_setup.fitToHeight = 0
     
-    ws.page_margins = PageMargins(
-        left=0.7, right=0.7, top=0.75, bottom=1.0,
-        header=0.3, footer=0.5
-    )
+    ws.page_margins = PageMargins(**PAGE_MARGINS)
     
     ws.oddFooter.center.text = "Seite &P von &N"
-    ws.oddFooter.center.size = 10
+    ws.oddFooter.center.size = FOOTER_SIZE
 
 def set_column_widths(ws):
     """Setzt optimale Spaltenbreiten für A4 Querformat"""
-    column_widths = {
-        'A': 18, 'B': 12, 'C': 15, 'D': 18, 'E': 12, 'F': 25, 'G': 15
-    }
-    for col, width in column_widths.items():
+    for col, width in COLUMN_WIDTHS.items():
         ws.column_dimensions[col].width = width
 
 def clean_template_rows(ws):
     """Löscht alle störenden Zeilen aus der Vorlage"""
+    from openpyxl.styles import Border, PatternFill
+
     # Zeile 9: Technische Spaltennamen
     for col in ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']:
         ws[f"{col}{TEMPLATE_ROW}"].value = None
@@ -141,6 +165,8 @@ def clean_template_rows(ws):
 
 def set_and_format_headers(ws, header_row):
     """Setzt die Header-Titel und formatiert sie - STRIKT nur A-F"""
+    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+
     header_fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
     header_font = Font(bold=True)
     bottom_border = Border(bottom=Side(style='thin'))
@@ -161,6 +187,8 @@ def set_and_format_headers(ws, header_row):
 
 def apply_cell_formatting(ws, row, col_letter, value, is_total_row=False):
     """Wendet einheitliche Formatierung auf Zellen an"""
+    from openpyxl.styles import Font, Alignment, PatternFill
+
     cell = ws[f"{col_letter}{row}"]
     cell.value = value
     
@@ -187,190 +215,1000 @@ def map_cost_center(value: str) -> str:
     code_digits = "".join(ch for ch in code if ch.isdigit())
     return COST_CENTER_MAP.get(code_digits or code, COST_CENTER_MAP.get(code, code))
 
-def calculate_optimal_na14_position(total_row_idx):
+def calculate_optimal_na14_position(total_row_idx, reporter=None, supplier=None):
     """Berechnet die optimale Position für NA14 mit garantiertem 3-Zeilen-Abstand"""
     # IMMER 3 Zeilen Abstand nach Total-Zeile
     na14_start_row = total_row_idx + 4
     
     # Prüfen ob Seitenumbruch sinnvoll ist (ab Zeile 30)
     if na14_start_row > 30:
-        print(f"NA14 wird in Zeile {na14_start_row} platziert (möglicherweise auf Seite 2)")
+        message = f"NA14 wird in Zeile {na14_start_row} platziert (möglicherweise auf Seite 2)"
+        if reporter is not None:
+            reporter.warning(message, supplier=supplier)
+        else:
+            print(message)
     
     return na14_start_row
 
+def extract_c_number(value):
+    """Sortierschlüssel einer Forderungseingabe: 'C0463_10' -> 10, sonst inf"""
+    try:
+        str_val = str(value).strip()
+        if '_' in str_val:
+            return int(str_val.split('_')[-1])
+        elif str_val.startswith('C') and len(str_val) > 1:
+            numbers = re.findall(r'\d+', str_val)
+            if numbers:
+                return int(numbers[-1])
+        return float('inf')
+    except:
+        return float('inf')
+
 def sort_by_c_number(df, col_name):
     """Sortiert DataFrame nach C-Nummern"""
-    def extract_c_number(value):
-        try:
-            str_val = str(value).strip()
-            if '_' in str_val:
-                return int(str_val.split('_')[-1])
-            elif str_val.startswith('C') and len(str_val) > 1:
-                numbers = re.findall(r'\d+', str_val)
-                if numbers:
-                    return int(numbers[-1])
-            return float('inf')
-        except:
-            return float('inf')
-    
     df_sorted = df.copy()
     df_sorted['_sort_key'] = df_sorted[col_name].apply(extract_c_number)
     df_sorted = df_sorted.sort_values('_sort_key').drop('_sort_key', axis=1)
     return df_sorted
 
-def main():
-    if not INPUT_XLSX.exists():
-        raise FileNotFoundError(f"Eingabedatei fehlt: {INPUT_XLSX}")
-    if not TEMPLATE_XLSX.exists():
-        raise FileNotFoundError(f"Vorlage fehlt: {TEMPLATE_XLSX}")
+def read_input(input_xlsx, concurrent=False, columns=None):
+    """
+    Liest Kontierung und NA15-Register ein und prüft die Pflichtspalten.
+    Das Format (XLSX, CSV, Parquet) ergibt sich aus der Dateiendung, siehe input_adapters.py.
+    concurrent: beide Register gleichzeitig in zwei Threads lesen
+    columns:    nur diese Spalten der Kontierung lesen (CSV/Parquet; None = alle)
+    """
+    na15_source = na15_path(input_xlsx)
+    if not na15_source.exists():
+        raise FileNotFoundError(f"NA15-Register fehlt: {na15_source}")
 
-    try:
-        df = pd.read_excel(INPUT_XLSX, engine="openpyxl", sheet_name=SHEET_NAME)
-        na15_index = load_na15_index_exact(INPUT_XLSX, NA15_SHEET_NAME)
+    # Kodierungsfehler in CSV-Dateien fängt read_frame ab (neuer Versuch mit cp1252/latin1)
+    if concurrent:
+        from concurrent.futures import ThreadPoolExecutor
 
-    except UnicodeDecodeError:
-        df = pd.read_excel(INPUT_XLSX, engine="openpyxl", encoding="latin1")
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="read") as executor:
+            na15_future = executor.submit(load_na15_index_exact, na15_source, NA15_SHEET_NAME)
+            df = read_frame(input_xlsx, sheet_name=SHEET_NAME, columns=columns)
+            na15_index = na15_future.result()
+    else:
+        df = read_frame(input_xlsx, sheet_name=SHEET_NAME, columns=columns)
+        na15_index = load_na15_index_exact(na15_source, NA15_SHEET_NAME)
 
-    required = [COL_SUP_CODE, COL_SUP_NAME, COL_SUP_EXT, COL_ER, COL_AMOUNT, COL_CC, COL_CODE, COL_REASON]
-    missing = [c for c in required if c not in df.columns]
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
     if missing:
-        raise ValueError(f"Pflichtspalten fehlen in {INPUT_XLSX.name}: {missing}")
+        raise ValueError(f"Pflichtspalten fehlen in {Path(input_xlsx).name}: {missing}")
 
-    # Normalisieren
+    return df, na15_index
+
+def normalize_input(df, pool=None):
+    """
+    Normalisiert Textspalten (getrimmte Strings) und Beträge (float).
+    Gleiche Texte werden über den StringPool interniert (Begründungen, Codes, ...).
+    """
+    import pandas as pd
+
+    pool = pool if pool is not None else StringPool()
     for c in [COL_SUP_CODE, COL_SUP_NAME, COL_SUP_CITY, COL_SUP_EXT, COL_ER, COL_CC, COL_CODE, COL_REASON]:
         if c in df.columns:
             df[c] = df[c].astype(str).fillna("").apply(
-                lambda x: x.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore').strip()
+                lambda x: pool(x.encode('utf-8', errors='ignore').decode('utf-8', errors='ignore').strip())
             )
     df[COL_AMOUNT] = pd.to_numeric(df[COL_AMOUNT], errors="coerce").fillna(0.0)
+    return df
 
-    wb = load_workbook(TEMPLATE_XLSX)
-    base_ws = wb.active
-    base_title = base_ws.title
-
+def list_suppliers(df):
+    """Liste der Kreditoren (Code, Name, ggf. Ort), sortiert nach Name und Code"""
     sup_cols = [COL_SUP_CODE, COL_SUP_NAME] + ([COL_SUP_CITY] if COL_SUP_CITY in df.columns else [])
-    suppliers = (
+    return (
         df[sup_cols]
         .drop_duplicates(subset=[COL_SUP_CODE])
         .sort_values(by=[COL_SUP_NAME, COL_SUP_CODE])
         .to_dict(orient="records")
     )
 
-    for sup in suppliers:
-        code = sup.get(COL_SUP_CODE, "")
-        name = sup.get(COL_SUP_NAME, "")
-        city = sup.get(COL_SUP_CITY, "") if COL_SUP_CITY in sup else ""
-
-        part = df[df[COL_SUP_CODE] == code].copy()
-        part = sort_by_c_number(part, COL_SUP_EXT)
-
-        ws = wb.copy_worksheet(base_ws)
-        ws.title = safe_sheet_name(name or code or "Kreditor")
-
-        setup_page_formatting(ws)
-        set_column_widths(ws)
-
-        ws[CELL_SUP_CODE] = code
-        ws[CELL_SUP_NAME] = f"{name}{(', ' + city) if city else ''}"
-
-        # WICHTIG: Alle störenden Vorlage-Zeilen löschen
-        clean_template_rows(ws)
-        
-        # Header formatieren (strikt nur A-G)
-        set_and_format_headers(ws, HEADER_ROW)
-
-        # Datenzeilen
-        start_row = TABLE_START_ROW
-        total_amount_sheet = float(part[COL_AMOUNT].sum())
-        
-        for i, (_, row) in enumerate(part.iterrows(), start=0):
-            r = start_row + i
-            for col_name, col_letter in COLS_TEMPLATE_ORDER:
-                val = row.get(col_name, "")
-                if col_name == COL_CC:
-                    val = map_cost_center(val)
-                elif col_name == COL_AMOUNT:
-                    val = float(row.get(col_name, 0))
-                apply_cell_formatting(ws, r, col_letter, val, is_total_row=False)
-
-        # Total-Zeile (ohne Spalte G zu formatieren)
-        total_row_idx = start_row + len(part)
-        for col_letter, val in [("A", "Total"), ("B", ""), ("C", total_amount_sheet), 
-                               ("D", ""), ("E", ""), ("F", "")]:
-            apply_cell_formatting(ws, total_row_idx, col_letter, val, is_total_row=True)
-        
-        # Spalte G in Total-Zeile explizit NICHT formatieren
-        ws[f"G{total_row_idx}"].fill = PatternFill()  # Keine Füllung
-        ws[f"G{total_row_idx}"].border = Border()     # Kein Rahmen
-
-        
-        # --- NA15-Begründungen (aus separatem Register) unterhalb einfügen ---
-        # ERs dieses Kreditors, die in der Haupttabelle NA15 sind
-        ers_na15 = (
-            part.loc[part[COL_CODE].astype(str).str.upper() == "NA15", COL_ER]
-                .astype(str).str.strip().dropna().unique().tolist()
-        )
-
-        rows = []
-        for er in sorted(ers_na15):
-            er_key = norm_er(er)                      # <-- normalize here
-            reasons = na15_index.get((name, er_key), [])
-            if reasons:
-                rows.append((er, "\n\n".join(reasons)))
-
-        if rows:
-            block_start = calculate_optimal_na14_position(total_row_idx)  # = total_row_idx + 4
-
-            # Überschrift
-            ws[f"A{block_start}"] = "Begründungen (NA15)"
-            ws[f"A{block_start}"].font = Font(bold=True, size=12)
-            ws[f"A{block_start}"].alignment = Alignment(horizontal='left', vertical='top')
-
-            # Kopfzeile
-            hdr = block_start + 1
-            ws[f"A{hdr}"] = "ER Nr."
-            ws[f"B{hdr}"] = "Begründung"
-
-            header_fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-            header_font = Font(bold=True)
-            bottom_border = Border(bottom=Side(style='thin'))
-            for col in ["A", "B"]:
-                c = ws[f"{col}{hdr}"]
-                c.fill = header_fill
-                c.font = header_font
-                c.alignment = Alignment(horizontal='center', vertical='center')
-                c.border = bottom_border
-
-            # Optional: Begründungs-Spalte breiter (B..F zusammenführen)
+# === Auswahl einzelner Kreditoren (--only) ===
+# Feldnamen für Filter wie "Code=NA14" oder "Klasse=Bestritten" (zusätzlich jede Spalte der Eingabe)
+SELECT_FIELDS = {
+    "code": COL_CODE,
+    "verfügung": COL_CC,
+    "klasse": COL_CC,
+    "kostenstelle": COL_CC,
+    "kreditor": COL_SUP_CODE,
+    "name": COL_SUP_NAME,
+}
+
+def norm_code(x) -> str:
+    """Kreditor-Code vergleichbar machen: '231621.0' und ' 231621 ' -> '231621'"""
+    return re.sub(r"\.0$", "", str(x).strip())
+
+def build_supplier_index(df):
+    """Index Kreditor-Code (norm_code) -> Zeilenpositionen in df"""
+    codes = df[COL_SUP_CODE].astype(str).fillna("").str.strip()
+    index = {}
+    for code, positions in codes.groupby(codes, sort=False).indices.items():
+        index.setdefault(norm_code(code), []).extend(positions.tolist())
+    return index
+
+def parse_selection(values):
+    """
+    Zerlegt --only-Angaben in (Codes, Filter). Jede Angabe ist
+    - eine Liste von Kreditor-Codes ("231621,250034"),
+    - eine Datei mit einem Code pro Zeile ("@codes.txt" oder ein vorhandener Pfad), oder
+    - ein Filter "FELD=WERT[,WERT...]" (z.B. "Code=NA14", "Klasse=Bestritten").
+    """
+    codes, filters = set(), []
+    for value in values:
+        value = value.strip()
+        path = Path(value[1:] if value.startswith("@") else value)
+        if value.startswith("@") or (path.suffix and path.is_file()):
+            with open(path, encoding="utf-8-sig") as f:
+                codes.update(norm_code(line) for line in f if line.strip() and not line.startswith("#"))
+        elif "=" in value:
+            field, _, wanted = value.partition("=")
+            column = SELECT_FIELDS.get(field.strip().lower(), field.strip())
+            filters.append((column, {w.strip().lower() for w in wanted.split(",") if w.strip()}))
+        else:
+            codes.update(norm_code(c) for c in value.split(",") if c.strip())
+    return codes, filters
+
+def select_rows(df, index, codes, filters):
+    """
+    Zeilenpositionen aller ausgewählten Kreditoren (jeweils alle ihre Zeilen).
+    Codes werden über den Index aufgelöst, Filter wählen Kreditoren mit mindestens
+    einer passenden Zeile.
+    """
+    selected = {c for c in codes if c in index}
+    for column, wanted in filters:
+        if column not in df.columns:
+            raise ValueError(f"Unbekanntes Feld für --only: {column}")
+        values = df[column].astype(str).fillna("").str.strip()
+        if column in (COL_SUP_CODE, COL_CC):
+            values = values.map(norm_code)
+        hit = values.str.lower().isin(wanted)
+        if column == COL_CC:
+            hit |= values.map(map_cost_center).str.lower().isin(wanted)
+        matched = df.loc[hit, COL_SUP_CODE].astype(str).fillna("").str.strip().map(norm_code)
+        selected.update(matched.unique().tolist())
+    return sorted(pos for code in selected for pos in index.get(code, []))
+
+def offset_cell(coord, row_offset):
+    """Verschiebt eine Zelladresse um row_offset Zeilen ('B4', 10 -> 'B14')"""
+    col, row = re.match(r"([A-Z]+)(\d+)$", coord).groups()
+    return f"{col}{int(row) + row_offset}"
+
+def render_supplier(wb, base_ws, doc, reporter=None):
+    """Erzeugt das Blatt eines Kreditors (Dokumentmodell doc) aus der Vorlage und gibt es zurück"""
+    code = doc.header.code
+    name = doc.header.name
+
+    ws = wb.copy_worksheet(base_ws)
+    title = safe_sheet_name(name or code or "Kreditor")
+    if doc.part > 1:
+        # Fortsetzungsblatt: "Name (2)", "Name (3)", ...
+        suffix = f" ({doc.part})"
+        title = title[:31 - len(suffix)].rstrip() + suffix
+    ws.title = title
+
+    setup_page_formatting(ws)
+    set_column_widths(ws)
+
+    # WICHTIG: Alle störenden Vorlage-Zeilen löschen
+    clean_template_rows(ws)
+
+    write_supplier_block(ws, doc, reporter)
+    return ws
+
+def build_beilage(sup, part, na15_index):
+    """
+    Baut das Dokumentmodell (document_model.Beilage) eines Kreditors: Zeilen nach
+    C-Nummer sortiert, Klassen gemappt, Total und NA15-Begründungen. Die Werte
+    werden spaltenweise als NumPy-Arrays gelesen und sortiert, ohne iterrows().
+    """
+    import numpy as np
+    from document_model import Beilage, Header, Reason, build_items
+
+    # Gleicher Sortieralgorithmus wie sort_by_c_number (DataFrame.sort_values), damit
+    # Zeilen mit gleicher C-Nummer in derselben Reihenfolge bleiben
+    order = np.array([extract_c_number(v) for v in part[COL_SUP_EXT].tolist()]).argsort(kind="quicksort")
+
+    def column(col_name):
+        if col_name not in part.columns:
+            return np.full(len(part), "", dtype=object)
+        return part[col_name].to_numpy()[order]
+
+    ers, codes = column(COL_ER), column(COL_CODE)
+    amounts = part[COL_AMOUNT].to_numpy(dtype=float)[order]
+
+    # Wenige verschiedene Kostenstellen: Bezeichnung einmal je Wert nachschlagen
+    cost_centres = column(COL_CC).tolist()
+    labels = {cc: map_cost_center(cc) for cc in set(cost_centres)}
+
+    items = build_items(
+        ext=column(COL_SUP_EXT),
+        er=ers,
+        amount=amounts,
+        cost_class=[labels[cc] for cc in cost_centres],
+        code=codes,
+        reason=column(COL_REASON),
+    )
+
+    # --- NA15-Begründungen (aus separatem Register) ---
+    # ERs dieses Kreditors, die in der Haupttabelle NA15 sind
+    name = sup.get(COL_SUP_NAME, "")
+    ers_na15 = {str(er).strip() for er, code in zip(ers.tolist(), codes.tolist())
+                if str(code).upper() == "NA15" and er == er}      # er == er: ohne NaN
+    reasons = []
+    for er in sorted(ers_na15):
+        texts = na15_index.get((name, norm_er(er)), [])     # <-- normalize here
+        if texts:
+            reasons.append(Reason(er, "\n\n".join(texts)))
+
+    header = Header(sup.get(COL_SUP_CODE, ""), name, sup.get(COL_SUP_CITY, "") if COL_SUP_CITY in sup else "")
+    return Beilage(header, items, float(amounts.sum()), reasons)
+
+CARRY_LABEL = "Übertrag"
+
+def write_sum_row(ws, row, label, amount):
+    """Total- bzw. Übertragszeile (A-F als Summenzeile formatiert, Spalte G bleibt leer)"""
+    from openpyxl.styles import Border, PatternFill
+
+    for col_letter, val in [("A", label), ("B", ""), ("C", amount),
+                            ("D", ""), ("E", ""), ("F", "")]:
+        apply_cell_formatting(ws, row, col_letter, val, is_total_row=True)
+
+    # Spalte G in Total-Zeile explizit NICHT formatieren
+    ws[f"G{row}"].fill = PatternFill()  # Keine Füllung
+    ws[f"G{row}"].border = Border()     # Kein Rahmen
+
+NA15_MERGE_COLUMNS = (2, 6)   # Begründung über B..F
+
+def na15_block_layout(reasons, hdr):
+    """
+    Plant den NA15-Block ab der Kopfzeile hdr: je Begründung (Zeile, Reason, Höhe)
+    mit grober Zeilenhöhe (None = Standard) sowie die zusammenzuführenden
+    Bereiche (Kopfzeile und jede Begründung, B..F) als (Zeile, Spalte, Zeile, Spalte).
+    """
+    first_col, last_col = NA15_MERGE_COLUMNS
+    rows, merges = [], [(hdr, first_col, hdr, last_col)]
+    for r, reason in enumerate(reasons, start=hdr + 1):
+        height = None
+        if reason.text:
+            est_lines = max(1, len(reason.text) // 80 + reason.text.count("\n") + 1)
+            height = min(est_lines * 15, 180)
+        rows.append((r, reason, height))
+        merges.append((r, first_col, r, last_col))
+    return rows, merges
+
+def merge_ranges(ws, ranges):
+    """
+    Führt die Bereiche eines Blocks über ws.merge_cells zusammen. ws.merge_cells
+    prüft jeden neuen Bereich gegen alle Bereiche des Blatts; mit --layout single
+    (alle Kreditoren in einem Blatt) wüchse der Aufwand quadratisch mit der Zahl
+    der Kreditoren. Während jedes Aufrufs enthält ws.merged_cells deshalb nur den
+    neuen Bereich, danach wird er dem Blatt zugeschlagen. Überschneidungen werden
+    nur gegen die Bereiche dieses Blocks geprüft (ein Block belegt eigene Zeilen)
+    und wie bisher übersprungen. ranges: (Zeile, Spalte, Zeile, Spalte).
+    """
+    from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+
+    sheet_ranges, merged = ws.merged_cells, {}
+    try:
+        for min_row, min_col, max_row, max_col in ranges:
+            cr = CellRange(min_col=min_col, min_row=min_row, max_col=max_col, max_row=max_row)
+            rows = range(min_row, max_row + 1)
+            if any(not cr.isdisjoint(other) for row in rows for other in merged.get(row, ())):
+                continue
+            ws.merged_cells = MultiCellRange()
+            ws.merge_cells(start_row=min_row, start_column=min_col, end_row=max_row, end_column=max_col)
+            sheet_ranges.ranges.update(ws.merged_cells.ranges)
+            for row in rows:
+                merged.setdefault(row, []).append(cr)
+    finally:
+        ws.merged_cells = sheet_ranges
+
+def write_supplier_block(ws, doc, reporter=None, row_offset=0):
+    """
+    Schreibt Kopfwerte, Tabelle, Total-Zeile und NA15-Block einer Beilage (Dokumentmodell doc);
+    Fortsetzungsteile (split_beilage) beginnen bzw. enden mit einer Übertragszeile.
+    Alle Zeilen sind um row_offset gegenüber der Vorlage verschoben (0 = eigenes Blatt).
+    Gibt die letzte beschriebene Zeile zurück.
+    """
+    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+
+    code = doc.header.code
+
+    # Leere Texte als leere Zelle schreiben (sonst geht "" beim Fortsetzen eines Checkpoints verloren)
+    ws[offset_cell(CELL_SUP_CODE, row_offset)] = code or None
+    ws[offset_cell(CELL_SUP_NAME, row_offset)] = doc.header.display_name or None
+
+    # Header formatieren (strikt nur A-G)
+    set_and_format_headers(ws, HEADER_ROW + row_offset)
+
+    # Datenzeilen (Fortsetzungsteile beginnen mit dem Übertrag der vorherigen Teile)
+    start_row = TABLE_START_ROW + row_offset
+    col_letters = [col_letter for _, col_letter in COLS_TEMPLATE_ORDER]
+    if doc.part > 1:
+        write_sum_row(ws, start_row, CARRY_LABEL, doc.carried)
+        start_row += 1
+
+    for i, item in enumerate(doc.items):
+        r = start_row + i
+        for col_letter, val in zip(col_letters, item.cells()):
+            apply_cell_formatting(ws, r, col_letter, val, is_total_row=False)
+
+    # Total-Zeile, bei Fortsetzung Übertrag auf den nächsten Teil
+    total_row_idx = start_row + len(doc.items)
+    write_sum_row(ws, total_row_idx, "Total" if doc.is_last else CARRY_LABEL, doc.total)
+    
+    # --- NA15-Begründungen (aus separatem Register) unterhalb einfügen ---
+    last_row = total_row_idx
+    if doc.reasons:
+        # = total_row_idx + 4 (Warnung bezieht sich auf die Zeile innerhalb der Beilage)
+        block_start = calculate_optimal_na14_position(total_row_idx - row_offset, reporter, code) + row_offset
+
+        # Überschrift
+        ws[f"A{block_start}"] = "Begründungen (NA15)"
+        ws[f"A{block_start}"].font = Font(bold=True, size=12)
+        ws[f"A{block_start}"].alignment = Alignment(horizontal='left', vertical='top')
+
+        # Kopfzeile
+        hdr = block_start + 1
+        ws[f"A{hdr}"] = "ER Nr."
+        ws[f"B{hdr}"] = "Begründung"
+
+        header_fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
+        header_font = Font(bold=True)
+        bottom_border = Border(bottom=Side(style='thin'))
+        for col in ["A", "B"]:
+            c = ws[f"{col}{hdr}"]
+            c.fill = header_fill
+            c.font = header_font
+            c.alignment = Alignment(horizontal='center', vertical='center')
+            c.border = bottom_border
+
+        # Zeilen, zusammengeführte Bereiche (B..F) und Zeilenhöhen in einem Durchgang
+        rows, merges = na15_block_layout(doc.reasons, hdr)
+        for r, reason, height in rows:
+            ws[f"A{r}"] = reason.er
+            ws[f"A{r}"].alignment = Alignment(horizontal='center', vertical='top')
+
+            ws[f"B{r}"] = reason.text
+            ws[f"B{r}"].alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
+            if height is not None:
+                ws.row_dimensions[r].height = height
+
+        merge_ranges(ws, merges)
+        r = hdr + 1 + len(rows)
+        last_row = r - 1
+
+    return last_row
+
+# === Alternative Ausgabe: alle Beilagen in einem Blatt ===
+CONSOLIDATED_SHEET_TITLE = "Beilagen"
+TITLE_ROWS = 2            # Vorlage-Zeilen 1-2 (Titel) werden als Drucktitel wiederholt
+BLOCK_FIRST_ROW = 3       # ab hier wird der Vorlagenkopf je Kreditor wiederholt
+
+def copy_template_rows(base_ws, ws, first_row, last_row, row_offset):
+    """Kopiert Werte, Stile und Zeilenhöhen der Vorlagenzeilen first_row..last_row"""
+    from copy import copy
+
+    for row in base_ws.iter_rows(min_row=first_row, max_row=last_row):
+        for src in row:
+            if src.value is None and not src.has_style:
+                continue
+            dst = ws.cell(row=src.row + row_offset, column=src.column, value=src.value)
+            if src.has_style:
+                dst._style = copy(src._style)
+        height = base_ws.row_dimensions[row[0].row].height if row else None
+        if height is not None:
+            ws.row_dimensions[row[0].row + row_offset].height = height
+
+class ConsolidatedSheet:
+    """
+    Schreibt alle Beilagen untereinander in ein Blatt. Jeder Kreditor beginnt auf
+    einer neuen Druckseite (Zeilenumbruch), der Vorlagentitel wird als Drucktitel
+    auf jeder Seite wiederholt. `top` ist die erste Zeile der nächsten Beilage.
+    """
+
+    def __init__(self, wb, base_ws, top=BLOCK_FIRST_ROW):
+        self.base_ws = base_ws
+        self.top = top
+        if CONSOLIDATED_SHEET_TITLE in wb.sheetnames:
+            # Fortsetzung eines gesicherten Laufs
+            self.ws = wb[CONSOLIDATED_SHEET_TITLE]
+            return
+        self.ws = wb.create_sheet(CONSOLIDATED_SHEET_TITLE)
+        setup_page_formatting(self.ws)
+        set_column_widths(self.ws)
+        copy_template_rows(base_ws, self.ws, 1, TITLE_ROWS, 0)
+        self.ws.print_title_rows = f"1:{TITLE_ROWS}"
+
+    def add(self, doc, reporter=None):
+        from openpyxl.worksheet.pagebreak import Break
+
+        row_offset = self.top - BLOCK_FIRST_ROW
+        if self.top > BLOCK_FIRST_ROW:
+            self.ws.row_breaks.append(Break(id=self.top - 1))
+        copy_template_rows(self.base_ws, self.ws, BLOCK_FIRST_ROW, HEADER_ROW, row_offset)
+        last_row = write_supplier_block(self.ws, doc, reporter, row_offset)
+        self.top = last_row + 2
+
+    def mark(self):
+        """Stand vor der nächsten Beilage (für rollback)."""
+        return self.top, len(self.ws.row_breaks.brk)
+
+    def rollback(self, mark):
+        """Entfernt alles, was seit mark geschrieben wurde (abgebrochene Beilage)."""
+        top, breaks = mark
+        ws = self.ws
+        for key in [key for key in ws._cells if key[0] >= top]:
+            del ws._cells[key]
+        ws.merged_cells.ranges = {r for r in ws.merged_cells.ranges if r.max_row < top}
+        for row in [row for row in ws.row_dimensions if row >= top]:
+            del ws.row_dimensions[row]
+        del ws.row_breaks.brk[breaks:]
+        self.top = top
+
+def stage_input(store, input_xlsx, concurrent=False):
+    """
+    Lädt die normalisierte Eingabe in die Staging-Datenbank, falls diese nicht zur
+    aktuellen Eingabe passt. Gibt True zurück, wenn neu geladen wurde.
+    """
+    from staging import input_fingerprint
+
+    fingerprint = input_fingerprint(input_xlsx)
+    if store.fingerprint() == fingerprint:
+        print(f"Staging-Datenbank ist aktuell: {store.path}")
+        return False
+    df, na15_index = read_input(input_xlsx, concurrent=concurrent, columns=REQUIRED_COLUMNS + [COL_SUP_CITY])
+    store.load(normalize_input(df), na15_index, fingerprint)
+    print(f"Eingabe in Staging-Datenbank geladen: {store.path} ({len(df)} Zeilen)")
+    return True
+
+def render_pipelined(wb, base_ws, suppliers, rows_of, na15_index, output_xlsx, reporter, workers=2, queue_size=8,
+                     max_rows=0):
+    """
+    Rendert alle Kreditoren gestaffelt und schreibt die Arbeitsmappe dabei direkt
+    nach output_xlsx (siehe pipeline.py). rows_of(code) liefert die Zeilen eines Kreditors.
+    Fortsetzungsblätter (max_rows) werden einzeln gerendert und geschrieben.
+    Meldet Kennzahlen je Stufe und Warteschlange.
+    """
+    from document_model import split_beilage
+    from pipeline import write_pipelined
+
+    def assemble(sup):
+        return build_beilage(sup, rows_of(sup.get(COL_SUP_CODE, "")), na15_index)
+
+    def render(doc):
+        for part in split_beilage(doc, max_rows):
+            yield render_supplier(wb, base_ws, part, reporter)
+        reporter.supplier_rendered(doc.header.code, doc.header.name, rows=len(doc))
+
+    # Die Vorlage verlässt die Blattliste vorab, damit die Blatt-IDs beim Streamen feststehen
+    wb.remove(base_ws)
+    stats = write_pipelined(wb, suppliers, assemble, render, output_xlsx, workers, queue_size)
+    reporter.pipeline_stats(**stats)
+    return stats
+
+def load_suppliers(input_xlsx, reporter, only=None, staging_db=None, concurrent=False):
+    """
+    Liest die Eingabe (direkt oder über eine Staging-Datenbank) und gibt
+    (Kreditoren, rows_of, na15_index, store) zurück; rows_of(code) liefert die Zeilen
+    eines Kreditors, store ist die StagingStore (nach dem Rendern schliessen) bzw. None.
+    Beendet die laufende Stufe "Eingabe lesen" des reporters.
+    """
+    codes, filters = parse_selection(only) if only else (set(), [])
+    # CSV/Parquet: nur benötigte Spalten lesen (inkl. der Felder aus --only-Filtern)
+    columns = REQUIRED_COLUMNS + [COL_SUP_CITY] + [column for column, _ in filters]
+
+    if staging_db:
+        from staging import StagingStore
+
+        store = StagingStore(staging_db)
+        try:
+            staged = stage_input(store, input_xlsx, concurrent=concurrent)
+            reporter.stage_end("Eingabe lesen", rows=store.row_count(), staged=staged)
+            keys = store.select(codes, filters) if only else None
+            if only and not keys:
+                raise ValueError(f"Keine Kreditoren für --only {' '.join(only)} gefunden")
+            return store.suppliers(keys), store.rows, store.na15, store
+        except BaseException:
+            store.close()
+            raise
+
+    df, na15_index = read_input(input_xlsx, concurrent=concurrent, columns=columns)
+    reporter.stage_end("Eingabe lesen", rows=len(df))
+
+    if only:
+        # Nur die Zeilen der ausgewählten Kreditoren normalisieren und rendern
+        positions = select_rows(df, build_supplier_index(df), codes, filters)
+        if not positions:
+            raise ValueError(f"Keine Kreditoren für --only {' '.join(only)} gefunden")
+        df = df.iloc[positions].reset_index(drop=True)
+
+    df = normalize_input(df)
+    index = build_supplier_index(df)
+
+    def rows_of(code):
+        return df.iloc[index[norm_code(code)]]
+
+    return list_suppliers(df), rows_of, na15_index, None
+
+def write_workbook(docs, template_xlsx, output_xlsx, reporter=None, layout="sheets", max_rows=0,
+                   shared_strings=True, deterministic=False):
+    """
+    Rendert fertige Beilagen (Dokumentmodelle) in eine neue Arbeitsmappe aus der
+    Vorlage und speichert sie (ohne Checkpoints). Vorlage und Ausgabe sind Pfade oder
+    Datei-Objekte (siehe save_workbook). Gibt je Beilage die Liste der Blattnamen
+    zurück (mehrere bei Fortsetzungsblättern).
+    """
+    from openpyxl import load_workbook
+    from document_model import split_beilage
+
+    wb = load_workbook(template_xlsx)
+    base_ws = wb.worksheets[0]
+    consolidated = ConsolidatedSheet(wb, base_ws) if layout == "single" else None
+    titles = []
+    for doc in docs:
+        doc_titles = []
+        for part in split_beilage(doc, max_rows):
+            if consolidated:
+                consolidated.add(part, reporter)
+                doc_titles.append(consolidated.ws.title)
+            else:
+                doc_titles.append(render_supplier(wb, base_ws, part, reporter).title)
+        titles.append(doc_titles)
+    wb.remove(base_ws)
+    save_workbook(wb, output_xlsx, shared_strings, deterministic)
+    return titles
+
+def save_workbook(wb, output, shared_strings=True, deterministic=False):
+    """
+    Speichert wb samt Nachbearbeitung (sharedStrings, byte-reproduzierbar) nach
+    output: Pfad oder beschreibbares Datei-Objekt. Bei einem Datei-Objekt läuft
+    alles im Speicher, ohne Dateizugriffe.
+    """
+    if not hasattr(output, "write"):
+        wb.save(output)
+        if shared_strings:
+            share_strings(output)
+        if deterministic:
+            make_reproducible(output)
+        return
+
+    from io import BytesIO
+    from shared_strings import share_strings_stream
+    from reproducible import make_reproducible_stream
+
+    buffer = BytesIO()
+    save_in_memory(wb, buffer)
+    if shared_strings:
+        buffer.seek(0)
+        shared = BytesIO()
+        share_strings_stream(buffer, shared)
+        buffer = shared
+    if deterministic:
+        buffer.seek(0)
+        stable = BytesIO()
+        make_reproducible_stream(buffer, stable)
+        buffer = stable
+    output.write(buffer.getvalue())
+
+def save_in_memory(wb, buffer):
+    """
+    Wie wb.save(buffer), aber ohne Festplatte: openpyxl schreibt jedes Blatt
+    zuerst in eine temporäre Datei, hier wird das Blatt-XML im Speicher erzeugt.
+    """
+    import datetime
+    from io import BytesIO
+    from zipfile import ZipFile, ZIP_DEFLATED
+    from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+    from openpyxl.worksheet._writer import WorksheetWriter
+    from openpyxl.writer.excel import ExcelWriter
+
+    class MemoryExcelWriter(ExcelWriter):
+        def write_worksheet(self, ws):
+            ws._drawing = SpreadsheetDrawing()
+            ws._drawing.charts = ws._charts
+            ws._drawing.images = ws._images
+            out = BytesIO()
+            writer = WorksheetWriter(ws, out)
+            writer.write()
+            ws._rels = writer._rels
+            self._archive.writestr(ws.path[1:], out.getvalue())
+            self.manifest.append(ws)
+
+    with ZipFile(buffer, "w", ZIP_DEFLATED, allowZip64=True) as archive:
+        wb.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+        MemoryExcelWriter(wb, archive).save()
+
+def generate(input_xlsx=INPUT_XLSX, template_xlsx=TEMPLATE_XLSX, output_xlsx=OUTPUT_XLSX, reporter=None,
+             shared_strings=True, layout="sheets", checkpoint_interval=300.0, resume=False,
+             deterministic=False, only=None, pipeline=False, workers=2, queue_size=8, staging_db=None,
+             max_rows=0, shard_rows=None, shard_mb=None, shard_workers=None):
+    """
+    Erzeugt die Beilage-Arbeitsmappe.
+    layout:              "sheets" = ein Blatt je Kreditor, "single" = alle Beilagen in einem
+                         Blatt mit Seitenumbruch je Kreditor
+    shared_strings:      Texte über eine deduplizierte sharedStrings-Tabelle schreiben
+    checkpoint_interval: Zwischenstand alle n Sekunden sichern (0 = keine Checkpoints)
+    resume:              beim ersten unfertigen Kreditor eines gesicherten Laufs fortsetzen
+    deterministic:       byte-reproduzierbar speichern (feste Zeitstempel und ZIP-Reihenfolge)
+    only:                nur diese Kreditoren erzeugen (Angaben wie bei --only, siehe parse_selection)
+    pipeline:            Aufbereiten, Rendern und Schreiben überlappend in Threads (siehe pipeline.py),
+                         die Eingabe wird vorher vollständig gelesen (beide Register gleichzeitig);
+                         nur mit layout="sheets" und ohne Checkpoints
+    workers, queue_size: Threads der Stufe Aufbereiten und Länge der Warteschlangen (nur mit pipeline)
+    staging_db:          Eingabe über eine SQLite-Staging-Datenbank lesen (siehe staging.py); sie wird
+                         nur neu geladen, wenn sich Eingabe oder NA15-Register geändert haben
+    max_rows:            Kreditoren mit mehr Rechnungszeilen auf Fortsetzungsblätter (bzw. -seiten bei
+                         layout="single") mit je höchstens max_rows Zeilen und Übertrag aufteilen (0 = aus)
+    shard_rows, shard_mb: Ausgabe auf mehrere Arbeitsmappen mit höchstens so vielen Rechnungszeilen bzw.
+                         geschätzten MB aufteilen, plus Index-Arbeitsmappe (siehe sharding.py);
+                         shard_workers = gleichzeitig geschriebene Arbeitsmappen (Standard: alle Kerne)
+    """
+    from openpyxl import load_workbook
+    from document_model import split_beilage
+
+    reporter = reporter or ProgressReporter()
+    input_xlsx, template_xlsx, output_xlsx = Path(input_xlsx), Path(template_xlsx), Path(output_xlsx)
+
+    if not input_xlsx.exists():
+        raise FileNotFoundError(f"Eingabedatei fehlt: {input_xlsx}")
+    if not template_xlsx.exists():
+        raise FileNotFoundError(f"Vorlage fehlt: {template_xlsx}")
+    if pipeline and (layout != "sheets" or resume):
+        raise ValueError("--pipeline ist nur mit --layout sheets und ohne --resume möglich")
+    sharded = shard_rows is not None or shard_mb is not None
+    if (shard_rows is not None and shard_rows <= 0) or (shard_mb is not None and shard_mb <= 0):
+        raise ValueError("--shard-rows/--shard-mb müssen grösser als 0 sein")
+    if sharded and (pipeline or resume):
+        raise ValueError("--shard-rows/--shard-mb sind nicht mit --pipeline oder --resume kombinierbar")
+
+    reporter.stage_start("Eingabe lesen")
+    suppliers, rows_of, na15_index, store = load_suppliers(input_xlsx, reporter, only, staging_db,
+                                                           concurrent=pipeline)
+    try:
+        if sharded:
+            return generate_sharded(suppliers, rows_of, na15_index, template_xlsx, output_xlsx, reporter,
+                                    shard_rows, shard_mb, shard_workers, layout=layout, max_rows=max_rows,
+                                    shared_strings=shared_strings, deterministic=deterministic)
+
+        checkpoint = None
+        if (checkpoint_interval or resume) and not pipeline:
+            fingerprint = run_fingerprint(input_xlsx, template_xlsx, [s.get(COL_SUP_CODE, "") for s in suppliers],
+                                          layout=layout, max_rows=max_rows,
+                                          na15=file_fingerprint(na15_path(input_xlsx)))
+            checkpoint = Checkpoint(output_xlsx, fingerprint, checkpoint_interval)
+
+        start, journal = 0, {}
+        restored = checkpoint.load() if resume else None
+        if restored:
+            wb, journal = restored
+            start = journal["done"]
+            print(f"Setze gesicherten Lauf fort: {start}/{len(suppliers)} Kreditoren bereits fertig")
+        else:
+            if resume:
+                print("Kein passender Checkpoint gefunden - starte von vorne")
+            wb = load_workbook(template_xlsx)
+        base_ws = wb.worksheets[0]
+        base_title = base_ws.title
+
+        consolidated = None
+        if layout == "single":
+            consolidated = ConsolidatedSheet(wb, base_ws, journal.get("top", BLOCK_FIRST_ROW))
+
+        def layout_state():
+            return {"top": consolidated.top} if consolidated else {}
+
+        def mark():
+            return len(wb.worksheets), consolidated.mark() if consolidated else None
+
+        def rollback(state):
+            # Checkpoints nur an Kreditor-Grenzen: halb gerenderte Blätter bzw. Zeilen verwerfen
+            sheets, block = state
+            for ws in wb.worksheets[sheets:]:
+                wb.remove(ws)
+            if consolidated:
+                consolidated.rollback(block)
+
+        reporter.stage_start("Beilagen rendern", total=len(suppliers))
+        if pipeline:
+            # Blätter werden schon während des Renderns geschrieben (Stufe "Speichern" nur Nachbearbeitung)
+            render_pipelined(wb, base_ws, suppliers, rows_of, na15_index, output_xlsx, reporter,
+                             workers, queue_size, max_rows)
+        else:
+            done = start
+            state = mark()
             try:
-                ws.merge_cells(start_row=hdr, start_column=2, end_row=hdr, end_column=6)
-            except Exception:
-                pass
+                for sup in suppliers[start:]:
+                    code = sup.get(COL_SUP_CODE, "")
+                    doc = build_beilage(sup, rows_of(code), na15_index)
+                    for part in split_beilage(doc, max_rows):
+                        if consolidated:
+                            consolidated.add(part, reporter)
+                        else:
+                            render_supplier(wb, base_ws, part, reporter)
+                    done += 1
+                    state = mark()
+                    reporter.supplier_rendered(code, sup.get(COL_SUP_NAME, ""), rows=len(doc))
+                    if checkpoint and checkpoint.save_if_due(wb, done, last_supplier=code, **layout_state()):
+                        reporter.checkpoint(done, str(checkpoint.dir))
+            except BaseException:
+                # Bisherige Arbeit nicht verlieren - mit --resume geht es hier weiter
+                if checkpoint and done > start and checkpoint.saved_done != done:
+                    rollback(state)
+                    checkpoint.save(wb, done, **layout_state())
+                    reporter.checkpoint(done, str(checkpoint.dir))
+                raise
 
-            r = hdr + 1
-            for er_val, reason_text in rows:
-                ws[f"A{r}"] = er_val
-                ws[f"A{r}"].alignment = Alignment(horizontal='center', vertical='top')
+        reporter.stage_end("Beilagen rendern", suppliers=len(suppliers))
 
-                ws[f"B{r}"] = reason_text
-                ws[f"B{r}"].alignment = Alignment(horizontal='left', vertical='top', wrap_text=True)
-                try:
-                    ws.merge_cells(start_row=r, start_column=2, end_row=r, end_column=6)
-                except Exception:
-                    pass
+        reporter.stage_start("Speichern")
+        if not pipeline:
+            wb.remove(wb[base_title])
+            wb.save(output_xlsx)
+        stats = share_strings(output_xlsx) if shared_strings else {}
+        if deterministic:
+            make_reproducible(output_xlsx)
+        reporter.stage_end("Speichern", path=str(output_xlsx), **stats)
+        if checkpoint:
+            checkpoint.clear()
+        if stats.get("string_cells"):
+            print(f"Texte: {stats['string_cells']} Zellen, {stats['unique_strings']} eindeutig "
+                  f"(Dedup-Quote {stats['dedup_ratio']:.0%}), "
+                  f"{stats['bytes_before'] // 1024} KB -> {stats['bytes_after'] // 1024} KB")
+        print(f"Fertig. Datei erstellt:\n{output_xlsx}")
+        return output_xlsx
+    finally:
+        if store is not None:
+            store.close()
 
-                # grobe Zeilenhöhe
-                if reason_text:
-                    est_lines = max(1, len(reason_text) // 80 + reason_text.count("\n") + 1)
-                    ws.row_dimensions[r].height = min(est_lines * 15, 180)
+def generate_sharded(suppliers, rows_of, na15_index, template_xlsx, output_xlsx, reporter,
+                     shard_rows=None, shard_mb=None, workers=None, **options):
+    """Schreibt die Beilagen auf mehrere Arbeitsmappen mit Index (siehe sharding.py)."""
+    from sharding import write_sharded
 
-                r += 1
+    def docs():
+        for sup in suppliers:
+            yield build_beilage(sup, rows_of(sup.get(COL_SUP_CODE, "")), na15_index)
 
+    max_bytes = int(shard_mb * 1024 * 1024) if shard_mb is not None else None
+    reporter.stage_start("Beilagen rendern", total=len(suppliers))
+    index, shards = write_sharded(docs(), template_xlsx, output_xlsx, reporter, shard_rows, max_bytes, workers,
+                                  **options)
+    reporter.stage_end("Beilagen rendern", suppliers=len(suppliers), shards=shards)
+    print(f"Fertig. {shards} Arbeitsmappen erstellt, Index:\n{index}")
+    return index
 
-    wb.remove(wb[base_title])
-    wb.save(OUTPUT_XLSX)
-    print(f"Fertig. Datei erstellt:\n{OUTPUT_XLSX}")
+def generate_pdf(input_xlsx=INPUT_XLSX, template_xlsx=TEMPLATE_XLSX, output=OUTPUT_PDF, reporter=None,
+                 split=False, workers=None, only=None, staging_db=None):
+    """
+    Erzeugt die Beilagen direkt als PDF (siehe pdf_output.py), ohne Excel.
+    split:   True = eine PDF-Datei je Kreditor im Verzeichnis output,
+             False = eine gemeinsame Datei output mit Lesezeichen je Kreditor
+    workers: Prozesse für das Rendern (Standard: alle Kerne)
+    only, staging_db wie bei generate.
+    """
+    from pdf_output import read_template_texts, write_pdfs
 
-if __name__ == "__main__":
+    reporter = reporter or ProgressReporter()
+    input_xlsx, template_xlsx, output = Path(input_xlsx), Path(template_xlsx), Path(output)
+
+    if not input_xlsx.exists():
+        raise FileNotFoundError(f"Eingabedatei fehlt: {input_xlsx}")
+    if not template_xlsx.exists():
+        raise FileNotFoundError(f"Vorlage fehlt: {template_xlsx}")
+
+    reporter.stage_start("Eingabe lesen")
+    suppliers, rows_of, na15_index, store = load_suppliers(input_xlsx, reporter, only, staging_db)
+    template_rows = read_template_texts(template_xlsx)
+
+    def docs():
+        for sup in suppliers:
+            yield build_beilage(sup, rows_of(sup.get(COL_SUP_CODE, "")), na15_index)
+
+    def rendered(header, rows, pages):
+        reporter.supplier_rendered(header.code, header.name, rows=rows)
+
+    reporter.stage_start("Beilagen rendern", total=len(suppliers))
+    try:
+        count, pages = write_pdfs(docs(), template_rows, output, split=split, workers=workers, on_rendered=rendered)
+    finally:
+        if store is not None:
+            store.close()
+    reporter.stage_end("Beilagen rendern", suppliers=count, pages=pages)
+    print(f"Fertig. PDF erstellt ({count} Beilagen, {pages} Seiten):\n{output}")
+    return output
+
+def check_input(input_xlsx=INPUT_XLSX, template_xlsx=TEMPLATE_XLSX):
+    """
+    Schnelle Prüfung ohne pandas: Dateien vorhanden, Register und Pflichtspalten
+    der Eingabe vorhanden. Gibt die Liste der gefundenen Probleme zurück.
+    """
+    problems = []
+    input_xlsx, template_xlsx = Path(input_xlsx), Path(template_xlsx)
+    if not template_xlsx.exists():
+        problems.append(f"Vorlage fehlt: {template_xlsx}")
+    if not input_xlsx.exists():
+        problems.append(f"Eingabedatei fehlt: {input_xlsx}")
+        return problems
+
+    try:
+        is_xlsx = input_format(input_xlsx) == "xlsx"
+    except ValueError as exc:
+        problems.append(str(exc))
+        return problems
+
+    checks = [
+        (input_xlsx, SHEET_NAME, 0, REQUIRED_COLUMNS),
+        (na15_path(input_xlsx), NA15_SHEET_NAME, 1, NA15_COLUMNS),
+    ]
+    for path, sheet_name, header_row, need in checks:
+        where = f"Blatt '{sheet_name}'" if is_xlsx else f"Datei {path.name}"
+        if not path.exists():
+            problems.append(f"NA15-Register fehlt: {path}")
+            continue
+        try:
+            header = set(read_columns(path, sheet_name, header_row))
+        except KeyError:
+            problems.append(f"Blatt '{sheet_name}' fehlt in {input_xlsx.name}")
+            continue
+        except ImportError as exc:
+            # Parquet ohne pyarrow/fastparquet: Meldung nur einmal für beide Register
+            if str(exc) not in problems:
+                problems.append(str(exc))
+            continue
+        missing = [c for c in need if c not in header]
+        if missing:
+            problems.append(f"Im {where} fehlen Spalten: {missing}")
+    return problems
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Erzeugt die Beilagen je Kreditor.")
+    sub = parser.add_subparsers(dest="command")
+
+    paths = argparse.ArgumentParser(add_help=False)
+    paths.add_argument("--input", type=Path, default=INPUT_XLSX, help=f"Eingabedatei (Standard: {INPUT_XLSX.name})")
+    paths.add_argument("--template", type=Path, default=TEMPLATE_XLSX, help=f"Vorlage (Standard: {TEMPLATE_XLSX.name})")
 
-    main()
+    gen = sub.add_parser("generate", parents=[paths], help="Beilagen erzeugen (Standard)")
+    gen.add_argument("--output", type=Path, default=OUTPUT_XLSX, help=f"Ausgabedatei (Standard: {OUTPUT_XLSX.name})")
+    gen.add_argument("--layout", choices=["sheets", "single"], default="sheets",
+                     help="sheets = ein Blatt je Kreditor (Standard), single = alle Beilagen in einem Blatt "
+                          "mit Seitenumbruch je Kreditor")
+    gen.add_argument("--checkpoint-interval", type=float, default=300.0, metavar="SEKUNDEN",
+                     help="Zwischenstand alle n Sekunden sichern (Standard: 300, 0 = aus)")
+    gen.add_argument("--resume", action="store_true",
+                     help="Gesicherten Lauf beim ersten unfertigen Kreditor fortsetzen")
+    gen.add_argument("--only", action="append", metavar="AUSWAHL",
+                     help="Nur ausgewählte Kreditoren erzeugen: Codes ('231621,250034'), Code-Datei ('@codes.txt') "
+                          "oder Filter ('Code=NA14', 'Klasse=Bestritten'); mehrfach angebbar")
+    gen.add_argument("--pipeline", action="store_true",
+                     help="Aufbereiten, Rendern und Schreiben überlappend in Threads mit begrenzten Warteschlangen "
+                          "(nur --layout sheets, ohne Checkpoints)")
+    gen.add_argument("--workers", type=int, default=2, metavar="N",
+                     help="Threads für das Aufbereiten der Kreditoren mit --pipeline (Standard: 2)")
+    gen.add_argument("--queue-size", type=int, default=8, metavar="N",
+                     help="Länge der Warteschlangen zwischen den Stufen mit --pipeline (Standard: 8)")
+    gen.add_argument("--staging-db", type=Path, metavar="PFAD",
+                     help="Eingabe über eine SQLite-Staging-Datenbank lesen (wird nur bei geänderter Eingabe neu "
+                          "geladen); Kreditoren werden per indizierter Abfrage gelesen")
+    gen.add_argument("--max-rows", type=int, default=0, metavar="N",
+                     help="Grosse Kreditoren auf Fortsetzungsblätter mit je höchstens N Rechnungszeilen und "
+                          "Übertrag aufteilen (Standard: 0 = aus)")
+    gen.add_argument("--shard-rows", type=int, metavar="N",
+                     help="Ausgabe auf mehrere Arbeitsmappen mit je höchstens N Rechnungszeilen aufteilen "
+                          "(zusammenhängende Namensbereiche, plus Index-Arbeitsmappe)")
+    gen.add_argument("--shard-mb", type=float, metavar="MB",
+                     help="Wie --shard-rows, aber mit einer geschätzten Dateigrösse je Arbeitsmappe")
+    gen.add_argument("--shard-workers", type=int, metavar="N",
+                     help="Gleichzeitig geschriebene Arbeitsmappen mit --shard-rows/--shard-mb (Standard: alle Kerne)")
+    gen.add_argument("--deterministic", action="store_true",
+                     help="Byte-reproduzierbar speichern: gleiche Eingabe + Vorlage ergeben identische Bytes")
+    gen.add_argument("--inline-strings", action="store_true",
+                     help="Texte wie openpyxl inline schreiben statt über eine deduplizierte sharedStrings-Tabelle")
+    gen.add_argument("--events-jsonl", metavar="PFAD",
+                     help="Fortschritts-Events zusätzlich als JSON-Lines in diese Datei schreiben ('-' = stdout)")
+
+    pdf = sub.add_parser("pdf", parents=[paths], help="Beilagen direkt als PDF erzeugen (ohne Excel)")
+    pdf.add_argument("--output", type=Path, default=OUTPUT_PDF,
+                     help=f"PDF-Datei bzw. mit --split Verzeichnis (Standard: {OUTPUT_PDF.name})")
+    pdf.add_argument("--split", action="store_true", help="Eine PDF-Datei je Kreditor statt einer gemeinsamen Datei")
+    pdf.add_argument("--workers", type=int, metavar="N", help="Prozesse für das Rendern (Standard: alle Kerne)")
+    pdf.add_argument("--only", action="append", metavar="AUSWAHL", help="Nur ausgewählte Kreditoren (wie bei generate)")
+    pdf.add_argument("--staging-db", type=Path, metavar="PFAD", help="Eingabe über eine Staging-Datenbank lesen")
+
+    sub.add_parser("check", parents=[paths], help="Eingabe und Vorlage prüfen, ohne zu erzeugen")
+
+    stage = sub.add_parser("stage", help="Eingabe in eine SQLite-Staging-Datenbank laden")
+    stage.add_argument("--input", type=Path, default=INPUT_XLSX, help=f"Eingabedatei (Standard: {INPUT_XLSX.name})")
+    stage.add_argument("--db", type=Path, required=True, help="Staging-Datenbank (SQLite)")
+
+    look = sub.add_parser("lookup", help="Zeilen und NA15-Begründungen aus einer Staging-Datenbank abfragen")
+    look.add_argument("--db", type=Path, required=True, help="Staging-Datenbank (SQLite)")
+    look.add_argument("--supplier", metavar="CODE", help="Kreditor-Code")
+    look.add_argument("--er", help="ER-Nr. (wird normalisiert)")
+    look.add_argument("--code", help="Verfügungs-Code, z.B. NA15")
+
+    cmp_ = sub.add_parser("compare", help="Zwei erzeugte Arbeitsmappen je Kreditor vergleichen")
+    cmp_.add_argument("old", help="Referenz-Arbeitsmappe")
+    cmp_.add_argument("new", help="Neu erzeugte Arbeitsmappe")
+    cmp_.add_argument("--max-diffs", type=int, default=20, help="Maximale Anzahl Detailzeilen pro Kreditor")
+    return parser
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # Ohne Unterbefehl wird wie bisher erzeugt
+    if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv.insert(0, "generate")
+    args = build_parser().parse_args(argv)
+
+    if args.command == "check":
+        problems = check_input(args.input, args.template)
+        for problem in problems:
+            print(f"✗ {problem}")
+        if not problems:
+            print("✓ Eingabe und Vorlage in Ordnung")
+        return 1 if problems else 0
+
+    if args.command in ("stage", "lookup"):
+        from staging import StagingStore
+
+        store = StagingStore(args.db)
+        try:
+            if args.command == "stage":
+                stage_input(store, args.input)
+                return 0
+            if store.fingerprint() is None:
+                print(f"✗ Keine Staging-Datenbank: {args.db}")
+                return 1
+            rows = store.lookup(args.supplier, args.er, args.code)
+        finally:
+            store.close()
+        for row in rows:
+            print("\t".join(str(row[c]) for c in (COL_SUP_CODE, COL_SUP_NAME, COL_SUP_EXT, COL_ER, COL_AMOUNT,
+                                                    COL_CODE, "NA15") if row[c] not in (None, "")))
+        print(f"{len(rows)} Zeilen")
+        return 0
+
+    if args.command == "compare":
+        from compare_workbooks import compare_workbooks
+
+        total = compare_workbooks(args.old, args.new, args.max_diffs)
+        print(f"{total} Abweichungen gefunden." if total else "Keine Abweichungen.")
+        return 1 if total else 0
+
+    sinks = [ConsoleSink()]
+    if args.command == "pdf":
+        reporter = ProgressReporter(sinks)
+        try:
+            generate_pdf(args.input, args.template, args.output, reporter, split=args.split,
+                         workers=args.workers, only=args.only, staging_db=args.staging_db)
+        finally:
+            reporter.close()
+        return 0
+
+    messages = contextlib.nullcontext()
+    if args.events_jsonl == "-":
+        # stdout gehört den JSON-Events; Statusmeldungen (print) gehen nach stderr
+        sinks = [JsonLinesSink(sys.stdout)]
+        messages = contextlib.redirect_stdout(sys.stderr)
+    elif args.events_jsonl:
+        sinks.append(JsonLinesSink(args.events_jsonl))
+    reporter = ProgressReporter(sinks)
+    try:
+        with messages:
+            generate(args.input, args.template, args.output, reporter,
+                     shared_strings=not args.inline_strings, layout=args.layout,
+                     checkpoint_interval=args.checkpoint_interval, resume=args.resume,
+                     deterministic=args.deterministic, only=args.only,
+                     pipeline=args.pipeline, workers=args.workers, queue_size=args.queue_size,
+                     staging_db=args.staging_db, max_rows=args.max_rows, shard_rows=args.shard_rows,
+                     shard_mb=args.shard_mb, shard_workers=args.shard_workers)
+    finally:
+        reporter.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
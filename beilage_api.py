@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Einbettbare Schnittstelle ohne Dateizugriffe.
+
+Für Integrationen (z.B. das Dokumentenmanagement), die Beilagen je Anfrage
+erzeugen: Eingabe als DataFrames, Vorlage als Pfad, Bytes oder Datei-Objekt,
+Ergebnis als Bytes oder in ein beliebiges beschreibbares Datei-Objekt. Die
+Arbeitsmappe wird vollständig im Speicher gerendert und nachbearbeitet
+(sharedStrings, reproduzierbar); nichts wird auf die Festplatte geschrieben.
+
+    from beilage_api import BeilageApi
+
+    api = BeilageApi(kontierung_df, na15_df, template="Beilage Verfuegung.xlsx")
+    data = api.workbook()                      # alle Kreditoren als XLSX-Bytes
+    data = api.beilage("231621")               # nur eine Beilage
+    api.workbook(output=response_stream)       # direkt in ein Datei-Objekt
+
+Eingabe und NA15-Register werden einmal normalisiert und indiziert; weitere
+Anfragen auf derselben Instanz rendern nur noch.
+"""
+
+from io import BytesIO
+from pathlib import Path
+
+from progress_events import ProgressReporter
+from PythonApplication4 import (
+    COL_SUP_CODE, REQUIRED_COLUMNS, TEMPLATE_XLSX,
+    build_beilage, build_supplier_index, list_suppliers, na15_index_from_frame, norm_code,
+    normalize_input, parse_selection, select_rows, write_workbook,
+)
+
+
+class BeilageApi:
+    """
+    Beilagen aus DataFrames erzeugen.
+
+    data:       Kontierung (Spalten wie das Register der Eingabe)
+    na15:       NA15-Register als DataFrame (Spalten 'ER', 'Name', 'Kommentar Begründung'),
+                als fertiger Index {(Name, ER): [Begründungen]} oder None
+    template:   Vorlage als Pfad, Bytes oder Datei-Objekt (wird einmal gelesen)
+    normalized: data ist bereits mit normalize_input normalisiert
+    reporter:   ProgressReporter für Warnungen (Standard: keine Ausgabe)
+    Die übergebenen DataFrames werden nicht verändert.
+    """
+
+    def __init__(self, data, na15=None, template=TEMPLATE_XLSX, normalized=False, reporter=None):
+        missing = [c for c in REQUIRED_COLUMNS if c not in data.columns]
+        if missing:
+            raise ValueError(f"Pflichtspalten fehlen in der Eingabe: {missing}")
+        self.df = data if normalized else normalize_input(data.copy())
+        self.index = build_supplier_index(self.df)
+        self.suppliers = list_suppliers(self.df)
+        if na15 is None:
+            self.na15_index = {}
+        elif isinstance(na15, dict):
+            self.na15_index = na15
+        else:
+            self.na15_index = na15_index_from_frame(na15)
+        self.template = _read_template(template)
+        self.reporter = reporter or ProgressReporter([])
+
+    def _docs(self, suppliers):
+        for sup in suppliers:
+            code = sup.get(COL_SUP_CODE, "")
+            yield build_beilage(sup, self.df.iloc[self.index[norm_code(code)]], self.na15_index)
+
+    def _render(self, suppliers, output, options):
+        target = output if output is not None else BytesIO()
+        write_workbook(list(self._docs(suppliers)), BytesIO(self.template), target, self.reporter, **options)
+        return target.getvalue() if output is None else None
+
+    def workbook(self, output=None, only=None, **options):
+        """
+        Arbeitsmappe mit allen (bzw. den mit only gewählten) Kreditoren.
+        only:    Angaben wie bei --only (Codes oder Filter wie 'Code=NA14')
+        output:  beschreibbares Datei-Objekt; ohne output werden die Bytes zurückgegeben
+        options: layout, max_rows, shared_strings, deterministic wie bei generate
+        """
+        suppliers = self.suppliers
+        if only:
+            codes, filters = parse_selection(only)
+            positions = select_rows(self.df, self.index, codes, filters)
+            selected = {norm_code(c) for c in self.df[COL_SUP_CODE].iloc[positions]}
+            suppliers = [s for s in suppliers if norm_code(s.get(COL_SUP_CODE, "")) in selected]
+            if not suppliers:
+                raise ValueError(f"Keine Kreditoren für --only {' '.join(only)} gefunden")
+        return self._render(suppliers, output, options)
+
+    def beilage(self, code, output=None, **options):
+        """Arbeitsmappe mit der Beilage eines einzelnen Kreditors (Bytes bzw. in output)."""
+        key = norm_code(code)
+        suppliers = [s for s in self.suppliers if norm_code(s.get(COL_SUP_CODE, "")) == key]
+        if not suppliers:
+            raise ValueError(f"Kreditor nicht gefunden: {code}")
+        return self._render(suppliers, output, options)
+
+
+def _read_template(template):
+    if isinstance(template, (bytes, bytearray)):
+        return bytes(template)
+    if hasattr(template, "read"):
+        return template.read()
+    path = Path(template)
+    if not path.exists():
+        raise FileNotFoundError(f"Vorlage fehlt: {path}")
+    return path.read_bytes()
+
+
+def generate_bytes(data, na15=None, template=TEMPLATE_XLSX, only=None, normalized=False, reporter=None, **options):
+    """Einmalige Anfrage: Arbeitsmappe als Bytes (siehe BeilageApi.workbook)."""
+    return BeilageApi(data, na15, template, normalized, reporter).workbook(only=only, **options)
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Messungen für den Beilage-Generator.
+
+Aufruf:
+    python benchmarks.py startup [--runs 5]
+    python benchmarks.py model [--input mock.xlsx] [--repeat 20]
+    python benchmarks.py api [--input mock.xlsx] [--requests 20]
+    python benchmarks.py resume [--input mock.xlsx] [--interrupt-at 15]
+
+startup: misst die Startzeit der leichten Unterbefehle (Import, --help, check)
+in frischen Prozessen und vergleicht den Median mit STARTUP_BUDGET_S.
+Exit-Code 1, wenn ein Budget überschritten wird.
+
+model: misst den Aufbau des Dokumentmodells (build_beilage, spaltenweise über
+NumPy-Arrays) gegen den früheren Weg über part.iterrows() und row.get() in
+Zeilen pro Sekunde. Beide Wege müssen dieselben Werte liefern (sonst Exit-Code 1).
+
+api: Latenz je Anfrage der In-Memory-Schnittstelle (beilage_api) gegen den
+Weg über eine Datei (Arbeitsmappe speichern und wieder einlesen), je für eine
+einzelne Beilage und die ganze Arbeitsmappe (Median). Beide Wege müssen
+dieselben Bytes liefern (sonst Exit-Code 1).
+
+resume: prüft Checkpoint und --resume. Der Lauf wird mitten im Rendern eines
+Kreditors abgebrochen (KeyboardInterrupt in write_supplier_block), dann mit
+--resume fortgesetzt; das Ergebnis muss für beide Layouts byte-identisch zu
+einem ununterbrochenen Lauf sein (sonst Exit-Code 1). Geprüft wird die Eingabe
+und eine daraus abgeleitete, in der jede Zeile NA15 ist und eine Begründung hat:
+Beim Laden des Checkpoints formatiert openpyxl die zusammengeführten Bereiche
+der NA15-Blöcke neu, die Stile müssen trotzdem gleich nummeriert bleiben.
+"""
+
+import argparse
+import itertools
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+SCRIPT = BASE_DIR / "PythonApplication4.py"
+
+# Budget in Sekunden (Median, inkl. Interpreter-Start). pandas darf hier nie geladen werden.
+STARTUP_BUDGET_S = {
+    "import": 0.15,
+    "--help": 0.15,
+    "check": 0.6,
+}
+
+STARTUP_COMMANDS = {
+    "import": [sys.executable, "-c",
+               "import sys, PythonApplication4; sys.exit('pandas' in sys.modules or 'openpyxl' in sys.modules)"],
+    "--help": [sys.executable, str(SCRIPT), "--help"],
+    "check": [sys.executable, str(SCRIPT), "check"],
+}
+
+
+def time_command(cmd, runs):
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        timings.append(time.perf_counter() - t0)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{' '.join(cmd)} fehlgeschlagen: {proc.stderr.decode(errors='replace')}")
+    return statistics.median(timings)
+
+
+def bench_startup(runs=5):
+    over_budget = []
+    for label, cmd in STARTUP_COMMANDS.items():
+        median = time_command(cmd, runs)
+        budget = STARTUP_BUDGET_S[label]
+        status = "ok" if median <= budget else "ÜBER BUDGET"
+        print(f"{label:<10} {median * 1000:8.1f} ms  (Budget {budget * 1000:.0f} ms)  {status}")
+        if median > budget:
+            over_budget.append(label)
+    return over_budget
+
+
+def legacy_values(sup, part, na15_index):
+    """Früherer Weg (Referenz): Tabellenwerte je Zeile über iterrows() und row.get()."""
+    from PythonApplication4 import (COLS_TEMPLATE_ORDER, COL_AMOUNT, COL_CC, COL_CODE, COL_ER, COL_SUP_EXT,
+                                    COL_SUP_NAME, map_cost_center, norm_er, sort_by_c_number)
+
+    part = sort_by_c_number(part, COL_SUP_EXT)
+    ers_na15 = (
+        part.loc[part[COL_CODE].astype(str).str.upper() == "NA15", COL_ER]
+            .astype(str).str.strip().dropna().unique().tolist()
+    )
+    na15_rows = []
+    for er in sorted(ers_na15):
+        reasons = na15_index.get((sup.get(COL_SUP_NAME, ""), norm_er(er)), [])
+        if reasons:
+            na15_rows.append((er, "\n\n".join(reasons)))
+
+    values = []
+    for _, row in part.iterrows():
+        cells = []
+        for col_name, _ in COLS_TEMPLATE_ORDER:
+            val = row.get(col_name, "")
+            if col_name == COL_CC:
+                val = map_cost_center(val)
+            elif col_name == COL_AMOUNT:
+                val = float(row.get(col_name, 0))
+            cells.append(val)
+        values.append(tuple(cells))
+    return values, float(part[COL_AMOUNT].sum()), na15_rows
+
+
+def bench_model(input_path, repeat=20):
+    import PythonApplication4 as app
+
+    df, na15_index = app.read_input(input_path)
+    df = app.normalize_input(df)
+    index = app.build_supplier_index(df)
+    jobs = [(sup, df.iloc[index[app.norm_code(sup.get(app.COL_SUP_CODE, ""))]]) for sup in app.list_suppliers(df)]
+    rows = sum(len(part) for _, part in jobs) * repeat
+
+    mismatches = 0
+    for sup, part in jobs:
+        doc = app.build_beilage(sup, part, na15_index)
+        values, total, na15_rows = legacy_values(sup, part, na15_index)
+        if ([item.cells() for item in doc.items] != values or doc.total != total
+                or [(r.er, r.text) for r in doc.reasons] != na15_rows):
+            mismatches += 1
+            print(f"Abweichung bei Kreditor {sup.get(app.COL_SUP_CODE)}")
+
+    timings = {}
+    for label, build in (("iterrows", legacy_values), ("Modell", app.build_beilage)):
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for sup, part in jobs:
+                build(sup, part, na15_index)
+        timings[label] = time.perf_counter() - t0
+        print(f"{label:<10} {timings[label] * 1000:8.1f} ms  {rows / timings[label]:10,.0f} Zeilen/s")
+    print(f"Faktor     {timings['iterrows'] / timings['Modell']:8.1f}x  ({len(jobs)} Kreditoren x {repeat})")
+    return mismatches
+
+
+def bench_api(input_path, requests=20):
+    import tempfile
+    import PythonApplication4 as app
+    from beilage_api import BeilageApi
+
+    df, na15_index = app.read_input(input_path)
+    api = BeilageApi(df, na15_index, app.TEMPLATE_XLSX)
+    codes = [sup.get(app.COL_SUP_CODE, "") for sup in api.suppliers]
+    options = {"deterministic": True}
+
+    def via_file(suppliers):
+        # Bisheriger Weg einer Integration: Arbeitsmappe auf die Festplatte schreiben und zurücklesen
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "beilage.xlsx"
+            app.write_workbook(list(api._docs(suppliers)), app.TEMPLATE_XLSX, path, **options)
+            return path.read_bytes()
+
+    cases = {
+        "Beilage": (lambda i: api.beilage(codes[i % len(codes)], **options),
+                    lambda i: via_file([api.suppliers[i % len(codes)]])),
+        "Mappe": (lambda i: api.workbook(**options), lambda i: via_file(api.suppliers)),
+    }
+    mismatches = 0
+    for label, (in_memory, on_disk) in cases.items():
+        if in_memory(0) != on_disk(0):
+            mismatches += 1
+            print(f"Abweichung: {label} im Speicher und über Datei unterschiedlich")
+        timings = {}
+        for path_label, request in (("Datei", on_disk), ("Speicher", in_memory)):
+            samples = []
+            for i in range(requests):
+                t0 = time.perf_counter()
+                request(i)
+                samples.append(time.perf_counter() - t0)
+            timings[path_label] = statistics.median(samples)
+        print(f"{label:<8} Datei {timings['Datei'] * 1000:8.1f} ms  Speicher {timings['Speicher'] * 1000:8.1f} ms  "
+              f"Faktor {timings['Datei'] / timings['Speicher']:.2f}x  ({requests} Anfragen)")
+    return mismatches
+
+
+def na15_heavy_input(input_path, directory):
+    """
+    Schreibt die Eingabe als CSV-Paar nach directory, jede Zeile mit Code NA15
+    und einer Begründung im NA15-Register (viele zusammengeführte Bereiche).
+    """
+    import pandas as pd
+    import PythonApplication4 as app
+    from input_adapters import read_frame
+
+    df = read_frame(input_path, sheet_name=app.SHEET_NAME)
+    df[app.COL_CODE] = "NA15"
+    reasons = [f"Begründung {i}: " + "Leistung nicht nachgewiesen. " * (1 + i % 4) for i in range(len(df))]
+    na15 = pd.DataFrame({"ER": df[app.COL_ER], "Name": df[app.COL_SUP_NAME], "Kommentar Begründung": reasons})
+    path = Path(directory) / "na15_bloecke.csv"
+    df.to_csv(path, index=False)
+    na15.to_csv(app.na15_path(path), index=False)
+    return path
+
+
+def check_resume(input_path, interrupt_at=15):
+    import contextlib
+    import io
+    import tempfile
+    import PythonApplication4 as app
+    from progress_events import ProgressReporter
+
+    render_block = app.write_supplier_block
+
+    def interrupted(ws, doc, reporter=None, row_offset=0):
+        calls["n"] += 1
+        if calls["n"] == interrupt_at:
+            ws[f"A{app.TABLE_START_ROW + row_offset}"] = "halb gerendert"
+            raise KeyboardInterrupt()
+        return render_block(ws, doc, reporter, row_offset)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        inputs = [("Eingabe", Path(input_path)), ("NA15-Blöcke", na15_heavy_input(input_path, tmp))]
+        for (label, source), layout in itertools.product(inputs, ("sheets", "single")):
+            reference = Path(tmp) / f"ref_{source.stem}_{layout}.xlsx"
+            resumed = Path(tmp) / f"res_{source.stem}_{layout}.xlsx"
+            options = {"layout": layout, "deterministic": True, "reporter": ProgressReporter([])}
+            app.generate(source, app.TEMPLATE_XLSX, reference, checkpoint_interval=0, **options)
+
+            calls = {"n": 0}
+            app.write_supplier_block = interrupted
+            try:
+                app.generate(source, app.TEMPLATE_XLSX, resumed, checkpoint_interval=3600, **options)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                app.write_supplier_block = render_block
+            app.generate(source, app.TEMPLATE_XLSX, resumed, checkpoint_interval=3600, resume=True, **options)
+
+            results.append((label, layout, reference.read_bytes() == resumed.read_bytes()))
+    for label, layout, same in results:
+        print(f"{label:<12} {layout:<8} Abbruch bei Kreditor {interrupt_at}, fortgesetzt: "
+              f"{'identisch' if same else 'ABWEICHUNG'}")
+    return sum(not same for _, _, same in results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Messungen für den Beilage-Generator.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    startup = sub.add_parser("startup", help="Startzeit der leichten Unterbefehle messen")
+    startup.add_argument("--runs", type=int, default=5)
+    model = sub.add_parser("model", help="Aufbau des Dokumentmodells gegen iterrows() messen")
+    model.add_argument("--input", type=Path, default=BASE_DIR / "mock.xlsx")
+    model.add_argument("--repeat", type=int, default=20)
+    api = sub.add_parser("api", help="In-Memory-Schnittstelle gegen den Weg über eine Datei messen")
+    api.add_argument("--input", type=Path, default=BASE_DIR / "mock.xlsx")
+    api.add_argument("--requests", type=int, default=20)
+    resume = sub.add_parser("resume", help="Abbruch mitten in einem Kreditor und --resume prüfen")
+    resume.add_argument("--input", type=Path, default=BASE_DIR / "mock.xlsx")
+    resume.add_argument("--interrupt-at", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    if args.bench == "startup":
+        return 1 if bench_startup(args.runs) else 0
+    if args.bench == "model":
+        return 1 if bench_model(args.input, args.repeat) else 0
+    if args.bench == "api":
+        return 1 if bench_api(args.input, args.requests) else 0
+    if args.bench == "resume":
+        return 1 if check_resume(args.input, args.interrupt_at) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpoints für lange Generierungsläufe.
+
+Während des Renderns wird die Arbeitsmappe periodisch (alle `interval` Sekunden)
+zusammen mit einem Fortschritts-Journal in '<Ausgabe>.checkpoint/' gesichert.
+Mit --resume lädt der Generator die Sicherung und setzt beim ersten noch nicht
+fertigen Kreditor fort. Das Journal enthält einen Fingerabdruck von Eingabe,
+Vorlage, Layout, --max-rows und Kreditorenliste; passt dieser nicht mehr, wird die
+Sicherung verworfen und neu begonnen.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+WORKBOOK_NAME = "partial.xlsx"
+JOURNAL_NAME = "journal.json"
+
+
+def file_fingerprint(path):
+    stat = Path(path).stat()
+    return f"{Path(path).name}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def run_fingerprint(input_path, template_path, supplier_codes, **options):
+    """Fingerabdruck eines Laufs: Eingabe, Vorlage, Optionen und Reihenfolge der Kreditoren."""
+    h = hashlib.sha1()
+    h.update(file_fingerprint(input_path).encode())
+    h.update(file_fingerprint(template_path).encode())
+    h.update(json.dumps(options, sort_keys=True, default=str).encode())
+    for code in supplier_codes:
+        h.update(str(code).encode() + b"\0")
+    return h.hexdigest()
+
+
+class Checkpoint:
+    """Sichert und lädt den Zwischenstand eines Laufs für eine Ausgabedatei."""
+
+    def __init__(self, output_path, fingerprint, interval=300.0):
+        output_path = Path(output_path)
+        self.dir = output_path.with_name(output_path.name + ".checkpoint")
+        self.workbook_path = self.dir / WORKBOOK_NAME
+        self.journal_path = self.dir / JOURNAL_NAME
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.last_save = time.monotonic()
+        self.saved_done = None
+
+    def load(self):
+        """
+        Gibt (wb, journal) zurück, wenn eine passende Sicherung existiert, sonst None.
+        journal["done"] ist die Anzahl bereits fertiger Kreditoren.
+        """
+        if not (self.journal_path.exists() and self.workbook_path.exists()):
+            return None
+        with open(self.journal_path, encoding="utf-8") as f:
+            journal = json.load(f)
+        if journal.get("fingerprint") != self.fingerprint:
+            return None
+
+        from openpyxl import load_workbook
+
+        return load_workbook(self.workbook_path), journal
+
+    def save_if_due(self, wb, done, **state):
+        if self.interval and time.monotonic() - self.last_save >= self.interval:
+            self.save(wb, done, **state)
+            return True
+        return False
+
+    def save(self, wb, done, **state):
+        """Schreibt Arbeitsmappe und Journal atomar (erst .tmp, dann umbenennen)."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp_wb = self.workbook_path.with_suffix(".tmp")
+        wb.save(tmp_wb)
+        os.replace(tmp_wb, self.workbook_path)
+
+        journal = {"fingerprint": self.fingerprint, "done": done, "saved_at": time.time()}
+        journal.update(state)
+        tmp_journal = self.journal_path.with_suffix(".tmp")
+        with open(tmp_journal, "w", encoding="utf-8") as f:
+            json.dump(journal, f, ensure_ascii=False, default=str)
+        os.replace(tmp_journal, self.journal_path)
+        self.last_save = time.monotonic()
+        self.saved_done = done
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Vergleicht zwei erzeugte Beilage-Arbeitsmappen (z.B. 'Beilage_Verfuegung_per_Kreditor.xlsx'
+vor und nach einer Änderung am Generator) und meldet Abweichungen je Kreditor.
+
+Beide Dateien werden read-only und blattweise gestreamt, es liegt also immer nur
+die aktuelle Zeile beider Blätter im Speicher. Enthält ein Blatt mehrere Beilagen
+(Layout "single"), wird an jeder Zeile "Kreditor-Nr." ein neuer Kreditor begonnen. Verglichen werden Werte,
+Zahlenformate und die wichtigsten Stile (Schrift, Füllung, Ausrichtung, Rahmen),
+getrennt nach Kopf, Tabelle, Total-Zeile und NA-Block.
+
+Aufruf:
+    python compare_workbooks.py ALT.xlsx NEU.xlsx [--max-diffs 20]
+
+Exit-Code 0 = identisch, 1 = Abweichungen gefunden.
+"""
+
+import argparse
+import sys
+from itertools import zip_longest
+
+from openpyxl import load_workbook
+from openpyxl.cell.read_only import EMPTY_CELL
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import coordinate_to_tuple
+
+from PythonApplication4 import CELL_SUP_CODE, TABLE_START_ROW
+
+BLOCK_HEADER = "Kopf"
+BLOCK_TABLE = "Tabelle"
+BLOCK_TOTAL = "Total"
+BLOCK_NA = "NA-Block"
+
+TOTAL_LABEL = "Total"
+KREDITOR_LABEL = "Kreditor-Nr."
+
+
+def _color(color):
+    return getattr(color, "rgb", None) if color is not None else None
+
+
+def style_key(cell):
+    """Liefert die vergleichsrelevanten Stilmerkmale einer Zelle (None = ungestylt)."""
+    if not getattr(cell, "has_style", False):
+        return None
+    font, fill, al, border = cell.font, cell.fill, cell.alignment, cell.border
+    return (
+        cell.number_format,
+        (font.b, font.i, font.sz, _color(font.color)),
+        (fill.fill_type, _color(fill.fgColor)),
+        (al.horizontal, al.vertical, al.wrap_text, al.indent),
+        tuple(getattr(getattr(border, side), "style", None) for side in ("left", "right", "top", "bottom")),
+    )
+
+
+class SheetDiff:
+    """Sammelt die Abweichungen eines Blatts; Details werden bei max_diffs gekappt."""
+
+    def __init__(self, title, max_diffs):
+        self.title = title
+        self.code = None
+        self.max_diffs = max_diffs
+        self.count = 0
+        self.per_block = {}
+        self.details = []
+
+    def add(self, block, coord, what, old, new):
+        self.count += 1
+        self.per_block[block] = self.per_block.get(block, 0) + 1
+        if len(self.details) < self.max_diffs:
+            self.details.append(f"[{block}] {coord} {what}: {old!r} -> {new!r}")
+
+    def report(self):
+        label = f"Kreditor {self.code}" if self.code else "Kreditor ?"
+        blocks = ", ".join(f"{b}: {n}" for b, n in self.per_block.items())
+        lines = [f"{label} (Blatt '{self.title}'): {self.count} Abweichungen ({blocks})"]
+        lines.extend(f"  {d}" for d in self.details)
+        if self.count > len(self.details):
+            lines.append(f"  ... {self.count - len(self.details)} weitere")
+        return "\n".join(lines)
+
+
+def compare_sheets(ws_old, ws_new, max_diffs=20):
+    """
+    Vergleicht zwei read-only Blätter zeilenweise und gibt eine Liste von SheetDiff
+    zurück (eines je Kreditor-Block im Blatt).
+    """
+    code_row, code_col = coordinate_to_tuple(CELL_SUP_CODE)
+    diff = SheetDiff(ws_old.title, max_diffs)
+    diffs = [diff]
+    block = BLOCK_HEADER
+    block_top = code_row           # Zeile mit "Kreditor-Nr." des aktuellen Blocks
+
+    rows = zip_longest(ws_old.iter_rows(), ws_new.iter_rows(), fillvalue=())
+    for r, (row_old, row_new) in enumerate(rows, start=1):
+        first_old = row_old[0].value if row_old else None
+        first_new = row_new[0].value if row_new else None
+
+        if KREDITOR_LABEL in (first_old, first_new) and r > code_row:
+            # nächste Beilage im selben Blatt
+            if r != block_top:
+                diff = SheetDiff(ws_old.title, max_diffs)
+                diffs.append(diff)
+            block, block_top = BLOCK_HEADER, r
+
+        if r >= block_top + TABLE_START_ROW - code_row and block == BLOCK_HEADER:
+            block = BLOCK_TABLE
+        if TOTAL_LABEL in (first_old, first_new) and block == BLOCK_TABLE:
+            block = BLOCK_TOTAL
+        elif block == BLOCK_TOTAL:
+            block = BLOCK_NA
+
+        for c, (a, b) in enumerate(zip_longest(row_old, row_new, fillvalue=EMPTY_CELL), start=1):
+            if r == block_top and c == code_col:
+                diff.code = a.value if a.value is not None else b.value
+            if a.value is None and b.value is None and not (
+                getattr(a, "has_style", False) or getattr(b, "has_style", False)
+            ):
+                continue
+            coord = f"{get_column_letter(c)}{r}"
+            if a.value != b.value:
+                diff.add(block, coord, "Wert", a.value, b.value)
+            sa, sb = style_key(a), style_key(b)
+            if sa != sb:
+                if (sa and sa[0]) != (sb and sb[0]):
+                    diff.add(block, coord, "Zahlenformat", sa and sa[0], sb and sb[0])
+                if (sa and sa[1:]) != (sb and sb[1:]):
+                    diff.add(block, coord, "Stil", sa and sa[1:], sb and sb[1:])
+    return diffs
+
+
+def compare_workbooks(old_path, new_path, max_diffs=20, out=sys.stdout):
+    """Vergleicht zwei Arbeitsmappen blattweise; gibt die Anzahl Abweichungen zurück."""
+    wb_old = load_workbook(old_path, read_only=True)
+    wb_new = load_workbook(new_path, read_only=True)
+    try:
+        names_old, names_new = wb_old.sheetnames, wb_new.sheetnames
+        total = 0
+        for name in names_old:
+            if name not in names_new:
+                print(f"Blatt '{name}' fehlt in {new_path}", file=out)
+                total += 1
+        for name in names_new:
+            if name not in names_old:
+                print(f"Blatt '{name}' ist neu in {new_path}", file=out)
+                total += 1
+        if [n for n in names_old if n in names_new] != [n for n in names_new if n in names_old]:
+            print("Reihenfolge der Blätter weicht ab", file=out)
+            total += 1
+
+        for name in names_old:
+            if name not in names_new:
+                continue
+            for diff in compare_sheets(wb_old[name], wb_new[name], max_diffs):
+                if diff.count:
+                    print(diff.report(), file=out)
+                    total += diff.count
+        return total
+    finally:
+        wb_old.close()
+        wb_new.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vergleicht zwei Beilage-Arbeitsmappen je Kreditor.")
+    parser.add_argument("old", help="Referenz-Arbeitsmappe")
+    parser.add_argument("new", help="Neu erzeugte Arbeitsmappe")
+    parser.add_argument("--max-diffs", type=int, default=20,
+                        help="Maximale Anzahl Detailzeilen pro Kreditor (Standard: 20)")
+    args = parser.parse_args(argv)
+
+    total = compare_workbooks(args.old, args.new, args.max_diffs)
+    if total:
+        print(f"{total} Abweichungen gefunden.")
+        return 1
+    print("Keine Abweichungen.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Dokumentmodell einer Beilage, unabhängig vom Ausgabeformat.
+
+Aus den Zeilen eines Kreditors wird einmal ein kompaktes Modell gebaut (Kopf,
+Rechnungszeilen, Total, NA15-Begründungen); alle Ausgaben (openpyxl-Blatt,
+PDF, ...) rendern nur noch daraus. Die Klassen verwenden __slots__, damit auch
+grosse Fälle wenig Speicher brauchen. Gebaut wird spaltenweise aus NumPy-Arrays
+(build_items), ohne pandas-Zeilenzugriffe über iterrows().
+"""
+
+import math
+
+
+class Header:
+    """Kopf der Beilage: Kreditor-Nr., Name und Ort."""
+
+    __slots__ = ("code", "name", "city")
+
+    def __init__(self, code, name, city=""):
+        self.code = code
+        self.name = name
+        self.city = city
+
+    @property
+    def display_name(self):
+        """Name wie im Kopf der Beilage: 'Name, Ort' bzw. nur 'Name'."""
+        return f"{self.name}{(', ' + self.city) if self.city else ''}"
+
+
+class LineItem:
+    """
+    Eine Rechnungszeile. Die Felder stehen in der Reihenfolge der Tabellenspalten
+    der Beilage (Forderungseingabe, RE-Nr., Betrag, Klasse, Verfügung, Begründung).
+    """
+
+    __slots__ = ("ext", "er", "amount", "cost_class", "code", "reason")
+
+    def __init__(self, ext, er, amount, cost_class, code, reason):
+        self.ext = ext
+        self.er = er
+        self.amount = amount
+        self.cost_class = cost_class
+        self.code = code
+        self.reason = reason
+
+    def cells(self):
+        return (self.ext, self.er, self.amount, self.cost_class, self.code, self.reason)
+
+
+class Reason:
+    """NA15-Begründung zu einer ER-Nr. (mehrere Texte bereits zusammengefügt)."""
+
+    __slots__ = ("er", "text")
+
+    def __init__(self, er, text):
+        self.er = er
+        self.text = text
+
+
+class Beilage:
+    """
+    Beilage eines Kreditors, oder ein Teil davon (siehe split_beilage).
+    Bei Teilen ist total die Zwischensumme bis einschliesslich dieses Teils und
+    carried der Übertrag aus den vorherigen Teilen; NA15-Begründungen hat nur
+    der letzte Teil.
+    """
+
+    __slots__ = ("header", "items", "total", "reasons", "part", "parts", "carried")
+
+    def __init__(self, header, items, total, reasons, part=1, parts=1, carried=0.0):
+        self.header = header
+        self.items = items
+        self.total = total
+        self.reasons = reasons
+        self.part = part
+        self.parts = parts
+        self.carried = carried
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def is_last(self):
+        return self.part == self.parts
+
+
+def split_beilage(doc, max_rows):
+    """
+    Teilt eine Beilage in Fortsetzungsteile mit höchstens max_rows Rechnungszeilen
+    (max_rows <= 0 oder kleine Beilage: unverändert). Jeder Teil trägt den
+    Übertrag der vorherigen Teile; der letzte Teil endet mit dem Total.
+    """
+    if max_rows <= 0 or len(doc.items) <= max_rows:
+        return [doc]
+    parts = (len(doc.items) + max_rows - 1) // max_rows
+    chunks, carried = [], 0.0
+    for part in range(1, parts + 1):
+        items = doc.items[(part - 1) * max_rows:part * max_rows]
+        # Letzter Teil: exakt das Total der Beilage (keine Rundungsdifferenz durch Teilsummen)
+        subtotal = doc.total if part == parts else carried + math.fsum(item.amount for item in items)
+        chunks.append(Beilage(doc.header, items, subtotal, doc.reasons if part == parts else [],
+                              part=part, parts=parts, carried=carried))
+        carried = subtotal
+    return chunks
+
+
+def build_items(ext, er, amount, cost_class, code, reason):
+    """
+    Rechnungszeilen aus gleich langen Spalten (NumPy-Arrays oder Listen).
+    Die Arrays werden einmal in Python-Objekte umgewandelt (tolist), danach
+    entsteht je Zeile nur noch ein LineItem.
+    """
+    columns = [c.tolist() if hasattr(c, "tolist") else list(c) for c in (ext, er, amount, cost_class, code, reason)]
+    return [LineItem(*values) for values in zip(*columns)]
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Eingabe-Adapter für Kontierung und NA15-Register.
+
+Der ERP-Export liegt oft als CSV oder Parquet vor; eine Umwandlung nach XLSX
+nur zum Wiedereinlesen kostet bei grossen Fällen Minuten. Der Adapter wird
+über die Dateiendung gewählt und liefert DataFrames mit den Originalspalten,
+Normalisierung und Auswertung laufen danach unverändert:
+
+- .xlsx/.xlsm: Register (Blätter) wie bisher über openpyxl
+- .csv/.txt:   pandas mit pyarrow-Engine (mehrfädig), falls installiert, sonst
+               C-Engine; Trennzeichen und Kodierung werden erkannt, bei ';' gilt
+               das Dezimalkomma; passt die Kodierung weiter hinten nicht, wird mit
+               cp1252 bzw. latin1 neu gelesen
+- .parquet/.pq: nur die benötigten Spalten werden gelesen (Spaltenprojektion)
+
+Bei CSV und Parquet liegt jedes Register in einer eigenen Datei. Das
+NA15-Register wird neben der Eingabe als '<Stamm>.na15<Endung>' gesucht
+(z.B. fall.csv + fall.na15.csv) und hat die Kopfzeile in der ersten Zeile.
+"""
+
+import csv
+import importlib.util
+from pathlib import Path
+
+XLSX_SUFFIXES = (".xlsx", ".xlsm")
+CSV_SUFFIXES = (".csv", ".txt")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+NA15_SUFFIX = ".na15"
+SNIFF_BYTES = 64 * 1024
+CSV_ENCODINGS = ("utf-8-sig", "cp1252", "latin1")   # latin1 schlägt nie fehl
+
+
+def input_format(path):
+    """'xlsx', 'csv' oder 'parquet' anhand der Dateiendung."""
+    suffix = Path(path).suffix.lower()
+    if suffix in XLSX_SUFFIXES:
+        return "xlsx"
+    if suffix in CSV_SUFFIXES:
+        return "csv"
+    if suffix in PARQUET_SUFFIXES:
+        return "parquet"
+    raise ValueError(f"Nicht unterstütztes Eingabeformat '{suffix}' ({Path(path).name}); "
+                     f"erwartet: {', '.join(XLSX_SUFFIXES + CSV_SUFFIXES + PARQUET_SUFFIXES)}")
+
+
+def na15_path(input_path):
+    """Datei mit dem NA15-Register: bei XLSX die Eingabe selbst, sonst '<Stamm>.na15<Endung>'."""
+    input_path = Path(input_path)
+    if input_format(input_path) == "xlsx":
+        return input_path
+    return input_path.with_name(input_path.stem + NA15_SUFFIX + input_path.suffix)
+
+
+def sniff_csv(path):
+    """Erkennt Kodierung und Trennzeichen anhand des Dateianfangs."""
+    with open(path, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+    if len(sample) == SNIFF_BYTES and b"\n" in sample:
+        sample = sample[:sample.rindex(b"\n")]     # kein angeschnittenes Mehrbyte-Zeichen
+    for encoding in CSV_ENCODINGS:
+        try:
+            text = sample.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    first_line = text.splitlines()[0] if text else ""
+    try:
+        delimiter = csv.Sniffer().sniff(first_line, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+    return encoding, delimiter
+
+
+def _has_pyarrow():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def read_columns(path, sheet_name=None, header=0):
+    """Nur die Spaltennamen einer Tabelle (ohne die Daten zu lesen)."""
+    fmt = input_format(path)
+    if fmt == "xlsx":
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True)
+        try:
+            if sheet_name not in wb.sheetnames:
+                raise KeyError(f"Blatt '{sheet_name}' fehlt in {Path(path).name}")
+            row = next(wb[sheet_name].iter_rows(min_row=header + 1, max_row=header + 1, values_only=True), ())
+        finally:
+            wb.close()
+        return [str(v).strip() for v in row if v is not None]
+    if fmt == "csv":
+        return [c.strip() for c in _raw_header(path, *sniff_csv(path))]
+    if _has_pyarrow():
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(path).names)
+    try:
+        from fastparquet import ParquetFile
+    except ImportError:
+        raise ImportError("Parquet-Eingabe benötigt pyarrow oder fastparquet (pip install pyarrow)") from None
+
+    return list(ParquetFile(str(path)).columns)
+
+
+def read_frame(path, sheet_name=None, header=0, columns=None):
+    """
+    Liest eine Tabelle als DataFrame: bei XLSX das Blatt sheet_name (Kopfzeile
+    in Zeile header+1), sonst die ganze Datei. columns: nur diese Spalten lesen,
+    soweit vorhanden (None = alle).
+    """
+    import pandas as pd
+
+    fmt = input_format(path)
+    if fmt == "xlsx":
+        return pd.read_excel(path, engine="openpyxl", sheet_name=sheet_name, header=header)
+
+    if fmt == "parquet":
+        wanted = None if columns is None else [c for c in read_columns(path) if c in set(columns)]
+        return pd.read_parquet(path, columns=wanted)
+
+    encoding, delimiter = sniff_csv(path)
+    header = _raw_header(path, encoding, delimiter)
+    # Die Kodierung ist nur am Dateianfang erkannt; scheitert sie weiter hinten,
+    # mit den folgenden Kandidaten neu lesen (latin1 zuletzt, schlägt nie fehl)
+    for candidate in CSV_ENCODINGS[CSV_ENCODINGS.index(encoding):]:
+        try:
+            df = _read_csv(path, candidate, delimiter, columns, header)
+            break
+        except Exception as exc:
+            if candidate == CSV_ENCODINGS[-1] or not _is_decode_error(exc):
+                raise
+    df.columns = [str(c).strip() for c in df.columns]
+    return df
+
+
+def _read_csv(path, encoding, delimiter, columns, header):
+    """
+    read_csv mit der Kodierung encoding. header: Kopfzeile in der am Dateianfang
+    erkannten Kodierung; sie bestimmt die Spaltennamen auch beim neuen Versuch.
+    """
+    import pandas as pd
+
+    names = dict(zip(_raw_header(path, encoding, delimiter), header))
+    options = {"sep": delimiter, "encoding": encoding}
+    if delimiter == ";":
+        options["decimal"] = ","
+    if columns is not None:
+        # Kopfzeilen aus ERP-Exporten enthalten gelegentlich Leerzeichen
+        wanted = set(columns)
+        options["usecols"] = [raw for raw, name in names.items() if name.strip() in wanted]
+    if _has_pyarrow():
+        options["engine"] = "pyarrow"
+    return pd.read_csv(path, **options).rename(columns=names)
+
+
+def _is_decode_error(exc):
+    """UnicodeDecodeError der C-Engine bzw. ArrowInvalid ('invalid UTF8') der pyarrow-Engine."""
+    return isinstance(exc, UnicodeDecodeError) or (type(exc).__name__ == "ArrowInvalid" and "utf8" in str(exc).lower())
+
+
+def _raw_header(path, encoding, delimiter):
+    with open(path, encoding=encoding, newline="") as f:
+        return next(csv.reader(f, delimiter=delimiter), [])
@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+Direkte PDF-Ausgabe der Beilagen (ohne Excel oder Office).
+
+Rendert das Dokumentmodell (document_model.Beilage) jedes Kreditors direkt als
+PDF, mit dem Layout der Excel-Beilage: A4 quer, Ränder und Fusszeile
+"Seite X von Y" wie setup_page_formatting, Spaltenbreiten wie
+set_column_widths, Kopf aus der Vorlage, Tabelle, Total-Zeile und
+NA15-Begründungen. Seitennummern zählen je Beilage.
+
+Ausgabe als eine PDF-Datei je Kreditor oder als eine gemeinsame Datei (mit
+Lesezeichen je Kreditor). Die Beilagen werden in mehreren Prozessen gerendert.
+Der PDF-Writer ist bewusst minimal (PDF 1.4, Standardschriften Helvetica mit
+WinAnsi-Kodierung) und braucht keine zusätzlichen Pakete.
+"""
+
+import os
+import re
+import unicodedata
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+
+from PythonApplication4 import (
+    CELL_SUP_CODE, CELL_SUP_NAME, COLUMN_WIDTHS, FOOTER_SIZE, HEADER_ROW, PAGE_MARGINS, TABLE_START_ROW,
+)
+
+# --- Seite (Punkte, 1 Zoll = 72 pt) ---
+PAGE_WIDTH, PAGE_HEIGHT = 841.89, 595.28          # A4 quer
+ROW_HEIGHT = 15.0                                  # Standard-Zeilenhöhe in Excel
+FONT_SIZE = 10
+LINE_HEIGHT = 12.0
+PADDING = 2.0
+INDENT = 7.0                                       # Excel-Einzug 1
+TABLE_COLUMNS = "ABCDEF"
+THOUSANDS_SEP = "'"                                # Zahlenformat #,##0 (de-CH)
+HEADER_FILL = (0.851, 0.851, 0.851)                # D9D9D9
+TOTAL_FILL = (0.949, 0.949, 0.949)                 # F2F2F2
+NA15_TITLE = "Begründungen (NA15)"
+NA15_HEADER = ("ER Nr.", "Begründung")
+NA15_GAP_ROWS = 3                                  # wie calculate_optimal_na14_position
+
+
+def column_width_pt(chars):
+    """Excel-Spaltenbreite (Zeichen) in Punkte: (Zeichen * 7 + 5) Pixel à 0.75 pt."""
+    return (chars * 7 + 5) * 0.75
+
+
+# --- Schriftmetrik (Helvetica, Breiten in 1/1000 em für die Zeichen 32..126) ---
+_HELVETICA = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_HELVETICA_BOLD = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+_FONTS = {False: ("F1", "Helvetica", _HELVETICA), True: ("F2", "Helvetica-Bold", _HELVETICA_BOLD)}
+
+
+def _char_width(ch, widths):
+    code = ord(ch)
+    if 32 <= code <= 126:
+        return widths[code - 32]
+    if ch == "ß":
+        return 611
+    base = unicodedata.normalize("NFD", ch)[0]      # Umlaute/Akzente: Breite des Grundbuchstabens
+    if base != ch and 32 <= ord(base) <= 126:
+        return widths[ord(base) - 32]
+    return 556
+
+
+def text_width(text, size=FONT_SIZE, bold=False):
+    widths = _FONTS[bold][2]
+    return sum(_char_width(ch, widths) for ch in text) * size / 1000.0
+
+
+def wrap_text(text, width, size=FONT_SIZE, bold=False):
+    """Bricht Text an Wortgrenzen (und Zeilenumbrüchen) auf die Breite width um."""
+    lines = []
+    for paragraph in str(text).split("\n"):
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = f"{line} {word}" if line else word
+            if text_width(candidate, size, bold) <= width or not line:
+                line = candidate
+            else:
+                lines.append(line)
+                line = word
+            # Einzelnes Wort breiter als die Spalte: hart umbrechen
+            while text_width(line, size, bold) > width and len(line) > 1:
+                cut = len(line) - 1
+                while cut > 1 and text_width(line[:cut], size, bold) > width:
+                    cut -= 1
+                lines.append(line[:cut])
+                line = line[cut:]
+        lines.append(line)
+    return lines
+
+
+def format_value(value):
+    """Zellinhalt wie in der Excel-Beilage: Beträge ungleich 0 als #,##0, sonst Standard."""
+    if value is None or value != value:        # value != value: NaN
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return str(value)
+    if value == 0:
+        return "0"
+    rounded = int(Decimal(repr(value)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    return f"{rounded:,}".replace(",", THOUSANDS_SEP)
+
+
+def _pdf_string(text):
+    data = str(text).encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _num(x):
+    return (b"%.2f" % x).rstrip(b"0").rstrip(b".")
+
+
+class Canvas:
+    """Zeichenbefehle einer Seite (PDF-Content-Stream)."""
+
+    def __init__(self):
+        self.ops = []
+
+    def fill_rect(self, x, y, w, h, rgb):
+        self.ops.append(b"q %s %s %s rg %s %s %s %s re f Q" % (*map(_num, rgb), _num(x), _num(y), _num(w), _num(h)))
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self.ops.append(b"q %s w %s %s m %s %s l S Q" % (_num(width), _num(x1), _num(y1), _num(x2), _num(y2)))
+
+    def text(self, x, y, text, size=FONT_SIZE, bold=False, clip=None):
+        """Text mit Grundlinie y; clip=(x, y, w, h) beschneidet auf die Zelle wie Excel."""
+        body = b"BT /%s %s Tf %s %s Td %s Tj ET" % (
+            _FONTS[bold][0].encode(), _num(size), _num(x), _num(y), _pdf_string(text))
+        if clip:
+            body = b"q %s %s %s %s re W n %s Q" % (*map(_num, clip), body)
+        self.ops.append(body)
+
+    def stream(self):
+        return zlib.compress(b"\n".join(self.ops), 6)
+
+
+class PdfWriter:
+    """
+    Schreibt eine PDF-Datei fortlaufend: Seiten werden sofort geschrieben, Seitenbaum,
+    Lesezeichen und Katalog erst am Ende. Feste Objekte: 1 Katalog, 2 Seitenbaum, 3-4 Schriften.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = open(self.path, "wb")
+        self.offsets = {}
+        self.next_id = 5
+        self.pages = []
+        self.bookmarks = []
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for obj_id, (name, base, _) in zip((3, 4), _FONTS.values()):
+            self._write_object(obj_id, b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>"
+                               % base.encode())
+
+    def _new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def _write_object(self, obj_id, body, stream=None):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % obj_id + body)
+        if stream is not None:
+            self.file.write(b"\nstream\n" + stream + b"\nendstream")
+        self.file.write(b"\nendobj\n")
+
+    def add_page(self, stream):
+        """Fügt eine Seite aus einem komprimierten Content-Stream an."""
+        content_id, page_id = self._new_id(), self._new_id()
+        self._write_object(content_id, b"<< /Length %d /Filter /FlateDecode >>" % len(stream), stream)
+        self._write_object(page_id, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] "
+                                    b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                           % (_num(PAGE_WIDTH), _num(PAGE_HEIGHT), content_id))
+        self.pages.append(page_id)
+
+    def add_bookmark(self, title):
+        """Lesezeichen auf die nächste hinzugefügte Seite."""
+        self.bookmarks.append((title, len(self.pages)))
+
+    def close(self):
+        outlines = b""
+        if self.bookmarks:
+            outline_id = self._new_id()
+            item_ids = [self._new_id() for _ in self.bookmarks]
+            for i, ((title, page_index), item_id) in enumerate(zip(self.bookmarks, item_ids)):
+                links = b""
+                if i > 0:
+                    links += b" /Prev %d 0 R" % item_ids[i - 1]
+                if i + 1 < len(item_ids):
+                    links += b" /Next %d 0 R" % item_ids[i + 1]
+                title_bytes = b"(\xfe\xff" + str(title).encode("utf-16-be").replace(b"\\", b"\\\\") \
+                    .replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+                self._write_object(item_id, b"<< /Title %s /Parent %d 0 R /Dest [%d 0 R /Fit]%s >>"
+                                   % (title_bytes, outline_id, self.pages[page_index], links))
+            self._write_object(outline_id, b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>"
+                               % (item_ids[0], item_ids[-1], len(item_ids)))
+            outlines = b" /Outlines %d 0 R /PageMode /UseOutlines" % outline_id
+
+        kids = b" ".join(b"%d 0 R" % p for p in self.pages)
+        self._write_object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages)))
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R%s >>" % outlines)
+
+        xref = self.file.tell()
+        size = self.next_id
+        self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for obj_id in range(1, size):
+            self.file.write(b"%010d 00000 n \n" % self.offsets[obj_id])
+        self.file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+        self.file.close()
+
+
+def read_template_texts(template_xlsx):
+    """
+    Texte des Vorlagenkopfs (Zeilen 1 bis HEADER_ROW, Spalten A-F) als
+    {Zeile: [(Spalte, Text, fett, Schriftgrösse)]}, ohne die Kreditor-Werte in B4/B5.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(template_xlsx, read_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = {}
+        for row in ws.iter_rows(min_row=1, max_row=HEADER_ROW, max_col=len(TABLE_COLUMNS)):
+            for cell in row:
+                if cell.value is None or cell.coordinate in (CELL_SUP_CODE, CELL_SUP_NAME):
+                    continue
+                size = min(float(cell.font.sz or FONT_SIZE), ROW_HEIGHT - 2 * PADDING)
+                rows.setdefault(cell.row, []).append((cell.column_letter, str(cell.value), bool(cell.font.b), size))
+    finally:
+        wb.close()
+    return rows
+
+
+class BeilageLayout:
+    """
+    Setzt eine Beilage auf Seiten. Jede Zeile ist (Höhe, Zeichenfunktion); passt eine
+    Zeile nicht mehr auf die Seite, beginnt eine neue (wie der Excel-Seitenumbruch).
+    """
+
+    def __init__(self, template_rows):
+        self.template_rows = template_rows
+        self.left = PAGE_MARGINS["left"] * 72
+        self.top = PAGE_HEIGHT - PAGE_MARGINS["top"] * 72
+        self.bottom = PAGE_MARGINS["bottom"] * 72
+        self.col_x, x = {}, self.left
+        for col in TABLE_COLUMNS:
+            self.col_x[col] = (x, column_width_pt(COLUMN_WIDTHS[col]))
+            x += self.col_x[col][1]
+        self.rows = []
+
+    # --- Zeilen ---
+    def add_row(self, draw, height=ROW_HEIGHT):
+        self.rows.append((height, draw))
+
+    def cell_text(self, canvas, top, height, col, text, align="left", bold=False, indent=0.0, size=FONT_SIZE,
+                  span=1, valign="center"):
+        x, width = self.col_x[col]
+        for extra in TABLE_COLUMNS[TABLE_COLUMNS.index(col) + 1:TABLE_COLUMNS.index(col) + span]:
+            width += self.col_x[extra][1]
+        text = str(text)
+        if not text:
+            return
+        w = text_width(text, size, bold)
+        if align == "right":
+            tx = x + width - PADDING - indent - w
+        elif align == "center":
+            tx = x + (width - w) / 2
+        else:
+            tx = x + PADDING + indent
+        ty = top - (height + size * 0.7) / 2 if valign == "center" else top - PADDING - size * 0.8
+        canvas.text(tx, ty, text, size, bold, clip=(x, top - height, width, height))
+
+    def band(self, canvas, top, height, cols, fill=None, border=False):
+        x0 = self.col_x[cols[0]][0]
+        x1 = self.col_x[cols[-1]][0] + self.col_x[cols[-1]][1]
+        if fill:
+            canvas.fill_rect(x0, top - height, x1 - x0, height, fill)
+        if border:
+            canvas.line(x0, top - height, x1, top - height)
+
+    def wrapped_rows(self, first_cells, col, text, span=1, **style):
+        """
+        Zeile mit umbrochenem Text in Spalte col (über span Spalten). Ist der Text
+        höher als eine Seite, wird er auf mehrere Zeilen (und Seiten) verteilt.
+        first_cells: weitere Zellen (Zeichenfunktion), nur im ersten Teil.
+        """
+        x, width = self.col_x[col]
+        for extra in TABLE_COLUMNS[TABLE_COLUMNS.index(col) + 1:TABLE_COLUMNS.index(col) + span]:
+            width += self.col_x[extra][1]
+        lines = wrap_text(text, width - 2 * PADDING - style.get("indent", 0.0)) if text else [""]
+        per_page = max(1, int((self.top - self.bottom - 2 * PADDING) // LINE_HEIGHT))
+        for start in range(0, len(lines), per_page):
+            chunk = lines[start:start + per_page]
+            height = max(ROW_HEIGHT, len(chunk) * LINE_HEIGHT + 2 * PADDING)
+
+            def draw(canvas, top, chunk=chunk, height=height, first=start == 0):
+                if first and first_cells:
+                    first_cells(canvas, top, height)
+                for i, line in enumerate(chunk):
+                    self.cell_text(canvas, top - i * LINE_HEIGHT, LINE_HEIGHT + PADDING, col, line,
+                                   span=span, valign="top", **style)
+            self.add_row(draw, height)
+
+    def build(self, doc):
+        # Vorlagenkopf (Titel, Beschriftungen) mit den Kreditor-Werten in B4/B5
+        values = {CELL_SUP_CODE: doc.header.code, CELL_SUP_NAME: doc.header.display_name}
+        for row in range(1, HEADER_ROW):
+            cells = list(self.template_rows.get(row, []))
+            for coord, value in values.items():
+                if int(coord[1:]) == row and value:
+                    cells.append((coord[0], value, False, FONT_SIZE))
+
+            def draw(canvas, top, cells=cells):
+                for col, text, bold, size in cells:
+                    # Kopftexte laufen wie in Excel über die Nachbarspalten hinaus
+                    self.cell_text(canvas, top, ROW_HEIGHT, col, text, bold=bold, size=size,
+                                   span=len(TABLE_COLUMNS) - TABLE_COLUMNS.index(col))
+            self.add_row(draw)
+
+        # Tabellenkopf
+        header = {col: text for col, text, _, _ in self.template_rows.get(HEADER_ROW, [])}
+
+        def draw_header(canvas, top):
+            self.band(canvas, top, ROW_HEIGHT, TABLE_COLUMNS, fill=HEADER_FILL, border=True)
+            for col in TABLE_COLUMNS:
+                self.cell_text(canvas, top, ROW_HEIGHT, col, header.get(col, ""), align="center", bold=True)
+        self.add_row(draw_header)
+        for _ in range(TABLE_START_ROW - HEADER_ROW - 1):
+            self.add_row(lambda canvas, top: None)
+
+        # Rechnungszeilen: Begründung (F) umbrochen, übrige Spalten einzeilig
+        for item in doc.items:
+            ext, er, amount, cost_class, code, reason = item.cells()
+
+            def draw_cells(canvas, top, height, ext=ext, er=er, amount=amount, cost_class=cost_class, code=code):
+                self.cell_text(canvas, top, height, "A", ext, indent=INDENT)
+                self.cell_text(canvas, top, height, "B", er, align="right", indent=INDENT)
+                self.cell_text(canvas, top, height, "C", format_value(amount), align="right", indent=INDENT)
+                self.cell_text(canvas, top, height, "D", cost_class, align="right", indent=INDENT)
+                self.cell_text(canvas, top, height, "E", code, align="center")
+            self.wrapped_rows(draw_cells, "F", reason or "", indent=INDENT)
+
+        # Total-Zeile
+        def draw_total(canvas, top):
+            self.band(canvas, top, ROW_HEIGHT, TABLE_COLUMNS, fill=TOTAL_FILL)
+            self.cell_text(canvas, top, ROW_HEIGHT, "A", "Total", bold=True, indent=INDENT)
+            self.cell_text(canvas, top, ROW_HEIGHT, "C", format_value(doc.total), align="right", bold=True,
+                           indent=INDENT)
+        self.add_row(draw_total)
+
+        # NA15-Begründungen
+        if doc.reasons:
+            for _ in range(NA15_GAP_ROWS):
+                self.add_row(lambda canvas, top: None)
+            self.add_row(lambda canvas, top: self.cell_text(canvas, top, ROW_HEIGHT, "A", NA15_TITLE, bold=True,
+                                                            size=12, span=len(TABLE_COLUMNS)))
+
+            def draw_na15_header(canvas, top):
+                self.band(canvas, top, ROW_HEIGHT, TABLE_COLUMNS, fill=HEADER_FILL, border=True)
+                self.cell_text(canvas, top, ROW_HEIGHT, "A", NA15_HEADER[0], align="center", bold=True)
+                self.cell_text(canvas, top, ROW_HEIGHT, "B", NA15_HEADER[1], align="center", bold=True,
+                               span=len(TABLE_COLUMNS) - 1)
+            self.add_row(draw_na15_header)
+            for reason in doc.reasons:
+                def draw_er(canvas, top, height, er=reason.er):
+                    self.cell_text(canvas, top, height, "A", er, align="center", valign="top")
+                self.wrapped_rows(draw_er, "B", reason.text, span=len(TABLE_COLUMNS) - 1)
+        return self
+
+    def pages(self):
+        """Komprimierte Content-Streams aller Seiten, mit Fusszeile 'Seite X von Y'."""
+        canvases, canvas, y = [], None, None
+        for height, draw in self.rows:
+            if canvas is None or y - height < self.bottom:
+                canvas, y = Canvas(), self.top
+                canvases.append(canvas)
+            draw(canvas, y)
+            y -= height
+        footer_y = PAGE_MARGINS["footer"] * 72
+        for number, canvas in enumerate(canvases, start=1):
+            text = f"Seite {number} von {len(canvases)}"
+            canvas.text((PAGE_WIDTH - text_width(text, FOOTER_SIZE)) / 2, footer_y, text, FOOTER_SIZE)
+        return [c.stream() for c in canvases]
+
+
+def render_beilage(doc, template_rows):
+    """Seiten (komprimierte Content-Streams) einer Beilage."""
+    return BeilageLayout(template_rows).build(doc).pages()
+
+
+def pdf_filename(doc):
+    """Dateiname je Kreditor: '<Name>_<Code>.pdf' ohne unzulässige Zeichen."""
+    stem = "_".join(part for part in (doc.header.name, doc.header.code) if part) or "Kreditor"
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", stem).strip("_")[:120] + ".pdf"
+
+
+def _render_job(job):
+    doc, template_rows, target_dir = job
+    pages = render_beilage(doc, template_rows)
+    if target_dir is None:
+        return doc.header, len(doc), pages
+    writer = PdfWriter(Path(target_dir) / pdf_filename(doc))
+    for page in pages:
+        writer.add_page(page)
+    writer.close()
+    return doc.header, len(doc), len(pages)
+
+
+def write_pdfs(docs, template_rows, output, split=False, workers=None, on_rendered=None):
+    """
+    Rendert alle Beilagen (Iterable von Dokumentmodellen, in Ausgabereihenfolge).
+    split=False: eine gemeinsame Datei `output` mit Lesezeichen je Kreditor
+    split=True:  eine Datei je Kreditor im Verzeichnis `output`
+    workers:     Anzahl Prozesse (Standard: alle Kerne; 1 = ohne Prozesse)
+    on_rendered(header, rows, pages) wird je Beilage in Ausgabereihenfolge aufgerufen.
+    Gibt (Anzahl Beilagen, Anzahl Seiten) zurück.
+    """
+    output = Path(output)
+    workers = workers or os.cpu_count() or 1
+    if split:
+        output.mkdir(parents=True, exist_ok=True)
+        writer = None
+    else:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        writer = PdfWriter(output)
+    target_dir = str(output) if split else None
+    count = pages_total = 0
+
+    def collect(header, rows, result):
+        nonlocal count, pages_total
+        n = result if split else len(result)
+        if writer is not None:
+            writer.add_bookmark(header.display_name or header.code)
+            for page in result:
+                writer.add_page(page)
+        count += 1
+        pages_total += n
+        if on_rendered:
+            on_rendered(header, rows, n)
+
+    jobs = ((doc, template_rows, target_dir) for doc in docs)
+    try:
+        if workers == 1:
+            for job in jobs:
+                collect(*_render_job(job))
+        else:
+            # Höchstens 4 Beilagen je Prozess unterwegs: begrenzter Speicher, Reihenfolge bleibt erhalten
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for job in jobs:
+                    pending.append(executor.submit(_render_job, job))
+                    if len(pending) >= workers * 4:
+                        collect(*pending.popleft().result())
+                while pending:
+                    collect(*pending.popleft().result())
+    finally:
+        if writer is not None:
+            writer.close()
+    return count, pages_total
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Gestaffelte Erzeugung (generate --pipeline).
+
+Statt erst alle Blätter zu rendern und danach die ganze Arbeitsmappe zu
+speichern, laufen die Stufen überlappend und sind durch begrenzte
+Warteschlangen entkoppelt:
+
+    Aufbereiten (n Threads) -> [Queue] -> Rendern (1 Thread) -> [Queue] -> Schreiben (1 Thread)
+
+- Aufbereiten: Daten eines Kreditors vorbereiten (ohne openpyxl), z.B. Zeilen
+               auswählen, sortieren, NA15-Begründungen zuordnen
+- Rendern:     Blatt (bzw. Blätter) erzeugen und jedes sofort zu Blatt-XML
+               serialisieren, danach werden die Zellen des Blatts freigegeben
+- Schreiben:   fertige Blatt-XML komprimiert in die ZIP-Datei schreiben
+
+Rendern bleibt einfädig, weil openpyxl nicht threadsicher ist. Die Stil-IDs
+werden dabei in derselben Reihenfolge vergeben wie bei wb.save(), die Datei
+ist inhaltlich identisch zur normalen Ausgabe. Die Länge der Warteschlangen
+wird periodisch gemessen; zusammen mit Arbeits- und Wartezeit je Stufe zeigt
+das, welche Stufe bremst (volle Queue vor einer Stufe = diese Stufe bremst).
+
+Das Lesen der Eingabe ist keine Stufe: Kreditoren werden nach Name sortiert
+und ihre Zeilen aus der ganzen Kontierung zusammengesucht, dafür müssen alle
+Zeilen vorliegen. Die Pipeline startet deshalb erst nach dem Lesen; mit
+--pipeline werden lediglich Kontierung und NA15-Register gleichzeitig gelesen.
+"""
+
+import datetime
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from zipfile import ZipFile, ZIP_DEFLATED
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 8
+MONITOR_INTERVAL = 0.05   # Sekunden zwischen zwei Messungen der Warteschlangen
+_POLL = 0.1               # Zeitscheibe für blockierende Queue-Zugriffe (Abbruch prüfen)
+_DONE = object()
+
+
+class StageStats:
+    """Arbeits- und Wartezeit einer Stufe (über alle Threads der Stufe summiert)."""
+
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, waiting=0.0, items=0):
+        with self._lock:
+            self.busy += busy
+            self.waiting += waiting
+            self.items += items
+
+    def as_dict(self):
+        return {"stage": self.name, "workers": self.workers, "items": self.items,
+                "busy_s": round(self.busy, 3), "wait_s": round(self.waiting, 3)}
+
+
+class QueueMonitor(threading.Thread):
+    """Misst alle `interval` Sekunden die Länge der Warteschlangen (Mittel und Maximum)."""
+
+    def __init__(self, queues, interval=MONITOR_INTERVAL):
+        super().__init__(name="pipeline-monitor", daemon=True)
+        self.queues = queues
+        self.interval = interval
+        self.samples = 0
+        self.total = {name: 0 for name in queues}
+        self.peak = {name: 0 for name in queues}
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        self.samples += 1
+        for name, q in self.queues.items():
+            depth = q.qsize()
+            self.total[name] += depth
+            self.peak[name] = max(self.peak[name], depth)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        self.sample()
+
+    def as_dict(self):
+        return {
+            name: {"capacity": q.maxsize, "max": self.peak[name],
+                   "mean": round(self.total[name] / max(self.samples, 1), 2)}
+            for name, q in self.queues.items()
+        }
+
+
+class PipelineAborted(Exception):
+    """Eine andere Stufe ist fehlgeschlagen."""
+
+
+def _put(q, item, abort):
+    while True:
+        if abort.is_set():
+            raise PipelineAborted()
+        try:
+            q.put(item, timeout=_POLL)
+            return
+        except queue.Full:
+            pass
+
+
+def _get(q, abort):
+    while True:
+        if abort.is_set():
+            raise PipelineAborted()
+        try:
+            return q.get(timeout=_POLL)
+        except queue.Empty:
+            pass
+
+
+class SheetWriter(threading.Thread):
+    """
+    Schreibt serialisierte Blätter in die ZIP-Datei, sobald sie fertig sind.
+    Nur dieser Thread greift bis zum Ende auf das Archiv zu.
+    """
+
+    def __init__(self, archive, manifest, inbox, abort, stats):
+        super().__init__(name="pipeline-writer", daemon=True)
+        self.archive = archive
+        self.manifest = manifest
+        self.inbox = inbox
+        self.abort = abort
+        self.stats = stats
+        self.error = None
+
+    def run(self):
+        from openpyxl.packaging.relationship import get_rels_path
+        from openpyxl.xml.functions import tostring
+
+        try:
+            while True:
+                t0 = time.perf_counter()
+                item = _get(self.inbox, self.abort)
+                t1 = time.perf_counter()
+                if item is _DONE:
+                    self.stats.add(waiting=t1 - t0)
+                    return
+                ws, ws_writer = item
+                self.archive.write(ws_writer.out, ws.path[1:])
+                self.manifest.append(ws)
+                ws_writer.cleanup()
+                if ws._rels:
+                    self.archive.writestr(get_rels_path(ws.path)[1:], tostring(ws._rels.to_tree()))
+                self.stats.add(busy=time.perf_counter() - t1, waiting=t1 - t0, items=1)
+        except PipelineAborted:
+            pass
+        except BaseException as exc:
+            self.error = exc
+            self.abort.set()
+
+
+def _excel_writer(wb, archive):
+    from openpyxl.writer.excel import ExcelWriter
+
+    class StreamedExcelWriter(ExcelWriter):
+        """ExcelWriter, dessen Blätter bereits während des Renderns geschrieben wurden."""
+
+        def _write_worksheets(self):
+            pass
+
+    return StreamedExcelWriter(wb, archive)
+
+
+def serialize_sheet(ws, sheet_id):
+    """Schreibt ein Blatt in eine temporäre XML-Datei und gibt die Zellen frei."""
+    from openpyxl.worksheet._writer import WorksheetWriter
+
+    ws._id = sheet_id
+    ws_writer = WorksheetWriter(ws)
+    ws_writer.write()
+    ws._rels = ws_writer._rels
+    ws._cells.clear()
+    return ws_writer
+
+
+def write_pipelined(wb, items, assemble, render, output_path,
+                    workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+    """
+    Rendert und speichert die Arbeitsmappe gestaffelt.
+
+    items:    Eingaben in Ausgabereihenfolge (z.B. Kreditoren)
+    assemble: item -> Daten; läuft in `workers` Threads und darf openpyxl nicht anfassen
+    render:   Daten -> neue Worksheets in wb (Generator); läuft im aufrufenden Thread,
+              jedes Blatt wird serialisiert, bevor das nächste entsteht
+    Die Arbeitsmappe darf ausser den neu gerenderten Blättern keine Blätter mit
+    Zeichnungen, Tabellen oder Kommentaren enthalten. Gibt Kennzahlen je Stufe
+    und Warteschlange zurück.
+    """
+    if workers < 1 or queue_size < 1:
+        raise ValueError("workers und queue_size müssen mindestens 1 sein")
+    output_path = Path(output_path)
+    abort = threading.Event()
+    assembled_q = queue.Queue(maxsize=queue_size)   # Futures in Ausgabereihenfolge
+    write_q = queue.Queue(maxsize=queue_size)       # serialisierte Blätter
+    stages = {
+        "assemble": StageStats("Aufbereiten", workers),
+        "render": StageStats("Rendern"),
+        "write": StageStats("Schreiben"),
+    }
+    monitor = QueueMonitor({"assembled": assembled_q, "write": write_q})
+
+    def timed_assemble(item):
+        t0 = time.perf_counter()
+        result = assemble(item)
+        stages["assemble"].add(busy=time.perf_counter() - t0, items=1)
+        return result
+
+    def feed(executor):
+        try:
+            for item in items:
+                _put(assembled_q, executor.submit(timed_assemble, item), abort)
+            _put(assembled_q, _DONE, abort)
+        except PipelineAborted:
+            pass
+
+    archive = ZipFile(output_path, "w", ZIP_DEFLATED, allowZip64=True)
+    wb.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    excel_writer = _excel_writer(wb, archive)
+    writer = SheetWriter(archive, excel_writer.manifest, write_q, abort, stages["write"])
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline-assemble")
+    feeder = threading.Thread(target=feed, args=(executor,), name="pipeline-feeder", daemon=True)
+
+    started = time.perf_counter()
+    ok = False
+    monitor.start()
+    writer.start()
+    feeder.start()
+    try:
+        render_stats = stages["render"]
+        while True:
+            t0 = time.perf_counter()
+            future = _get(assembled_q, abort)
+            if future is _DONE:
+                render_stats.add(waiting=time.perf_counter() - t0)
+                break
+            data = future.result()
+            t1 = time.perf_counter()
+            busy, waiting = 0.0, t1 - t0
+            for ws in render(data):
+                ws_writer = serialize_sheet(ws, len(wb.worksheets))
+                t2 = time.perf_counter()
+                busy += t2 - t1
+                _put(write_q, (ws, ws_writer), abort)
+                t1 = time.perf_counter()
+                waiting += t1 - t2
+            busy += time.perf_counter() - t1
+            render_stats.add(busy=busy, waiting=waiting, items=1)
+        _put(write_q, _DONE, abort)
+        writer.join()
+        if writer.error:
+            raise writer.error
+        excel_writer.write_data()
+        ok = True
+    except PipelineAborted:
+        if writer.error:
+            raise writer.error
+        raise
+    finally:
+        if not ok:
+            abort.set()
+        feeder.join()
+        executor.shutdown(wait=True, cancel_futures=True)
+        writer.join()
+        monitor.stop()
+        archive.close()
+        if not ok:
+            output_path.unlink(missing_ok=True)
+
+    return {
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "stages": [s.as_dict() for s in stages.values()],
+        "queues": monitor.as_dict(),
+    }
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Strukturierte Fortschritts-Events für den Beilage-Generator.
+
+Der Generator meldet nur noch Events (Stufe Start/Ende, Kreditor gerendert,
+Warnung mit Kreditor-Code) an einen ProgressReporter. Wie und wo diese
+ausgegeben werden, entscheiden die Sinks:
+
+- ConsoleSink:   gedrosselte Konsolenausgabe mit Rate (Zeilen/s) und ETA
+- JsonLinesSink: ein JSON-Objekt pro Zeile, für Scheduler/Monitoring
+
+Ein Sink ist ein beliebiges Callable, das ein Event-Dict entgegennimmt.
+"""
+
+import json
+import sys
+import time
+
+STAGE_START = "stage_start"
+STAGE_END = "stage_end"
+SUPPLIER_RENDERED = "supplier_rendered"
+WARNING = "warning"
+CHECKPOINT = "checkpoint"
+PIPELINE_STATS = "pipeline_stats"
+
+
+def _fmt_seconds(seconds):
+    seconds = int(max(0, seconds))
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+class ProgressReporter:
+    """Verteilt Events an alle registrierten Sinks."""
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks) if sinks is not None else [ConsoleSink()]
+
+    def emit(self, event, **fields):
+        record = {"event": event, "ts": round(time.time(), 3)}
+        record.update(fields)
+        for sink in self.sinks:
+            sink(record)
+
+    def stage_start(self, stage, total=None):
+        self.emit(STAGE_START, stage=stage, total=total)
+
+    def stage_end(self, stage, **fields):
+        self.emit(STAGE_END, stage=stage, **fields)
+
+    def supplier_rendered(self, code, name, rows):
+        self.emit(SUPPLIER_RENDERED, supplier=code, name=name, rows=rows)
+
+    def warning(self, message, supplier=None):
+        self.emit(WARNING, message=message, supplier=supplier)
+
+    def checkpoint(self, done, path):
+        self.emit(CHECKPOINT, done=done, path=path)
+
+    def pipeline_stats(self, elapsed_s, stages, queues):
+        self.emit(PIPELINE_STATS, elapsed_s=elapsed_s, stages=stages, queues=queues)
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close()
+
+
+class ConsoleSink:
+    """
+    Konsolenausgabe mit Drosselung: höchstens eine Fortschrittszeile pro `interval`
+    Sekunden und höchstens `max_warnings` einzelne Warnungen pro Stufe, der Rest
+    wird am Stufenende zusammengefasst.
+    """
+
+    def __init__(self, stream=None, interval=1.0, max_warnings=10):
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.max_warnings = max_warnings
+        self._reset(None, None)
+
+    def _reset(self, stage, total):
+        self.stage = stage
+        self.total = total
+        self.done = 0
+        self.rows = 0
+        self.warnings = 0
+        self.started = time.monotonic()
+        self.last_print = 0.0
+
+    def _write(self, text):
+        print(text, file=self.stream, flush=True)
+
+    def _progress_line(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        line = f"  {self.done}"
+        if self.total:
+            eta = (self.total - self.done) * elapsed / max(self.done, 1)
+            line += f"/{self.total} ({100.0 * self.done / self.total:.0f}%)"
+        line += f", {self.rows / elapsed:,.0f} Zeilen/s"
+        if self.total:
+            line += f", ETA {_fmt_seconds(eta)}"
+        return line
+
+    def __call__(self, event):
+        kind = event["event"]
+        if kind == STAGE_START:
+            self._reset(event["stage"], event.get("total"))
+            suffix = f" ({self.total})" if self.total else ""
+            self._write(f"{event['stage']}{suffix}...")
+        elif kind == SUPPLIER_RENDERED:
+            self.done += 1
+            self.rows += event.get("rows") or 0
+            now = time.monotonic()
+            if now - self.last_print >= self.interval:
+                self.last_print = now
+                self._write(self._progress_line())
+        elif kind == WARNING:
+            self.warnings += 1
+            if self.warnings <= self.max_warnings:
+                who = f" [{event['supplier']}]" if event.get("supplier") else ""
+                self._write(f"  Warnung{who}: {event['message']}")
+        elif kind == CHECKPOINT:
+            self._write(f"  Checkpoint: {event['done']} Kreditoren gesichert ({event['path']})")
+        elif kind == PIPELINE_STATS:
+            for st in event["stages"]:
+                self._write(f"  {st['stage']:<12} {st['workers']} Thread(s), {st['items']} Kreditoren, "
+                            f"Arbeit {st['busy_s']:.2f} s, Warten {st['wait_s']:.2f} s")
+            for name, q in event["queues"].items():
+                self._write(f"  Queue {name:<10} Länge Mittel {q['mean']:.1f}, Max {q['max']}/{q['capacity']}")
+        elif kind == STAGE_END:
+            if self.done:
+                self._write(self._progress_line())
+            if self.warnings > self.max_warnings:
+                self._write(f"  ... {self.warnings - self.max_warnings} weitere Warnungen unterdrückt")
+            elapsed = time.monotonic() - self.started
+            self._write(f"{event['stage']} fertig ({_fmt_seconds(elapsed)})")
+
+
+class JsonLinesSink:
+    """Schreibt jedes Event als eine JSON-Zeile in eine Datei oder einen Stream."""
+
+    def __init__(self, target):
+        if hasattr(target, "write"):
+            self.stream, self._owned = target, False
+        else:
+            self.stream, self._owned = open(target, "a", encoding="utf-8"), True
+
+    def __call__(self, event):
+        self.stream.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        if event["event"] == STAGE_END:
+            self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+        if self._owned:
+            self.stream.close()
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Byte-reproduzierbare Ausgabe.
+
+Zwei Läufe mit identischer Eingabe und Vorlage unterscheiden sich sonst nur durch
+Zeitstempel: die Änderungszeit jedes ZIP-Eintrags und dcterms:modified in
+docProps/core.xml (openpyxl setzt beim Speichern "jetzt"). make_reproducible()
+schreibt die Datei mit festen Zeitstempeln, fester Eintragsreihenfolge und
+festen ZIP-Attributen neu, damit gleiche Inhalte gleiche Bytes (und Hashes) ergeben.
+
+Die Nummern der Zellformate in styles.xml hängen dagegen davon ab, wie openpyxl
+die Stile im Speicher angelegt hat: Nach dem Laden eines Checkpoints (--resume)
+formatiert openpyxl die zusammengeführten Bereiche neu, und es entstehen zusätzliche,
+inhaltlich gleiche Rahmen und Formate. canonical_styles() nummeriert Rahmen und
+Zellformate deshalb nach ihrer ersten Verwendung in den Blättern neu. Die
+Reihenfolge der Texte (sharedStrings) ist stabil, weil sie in der Reihenfolge des
+ersten Auftretens geschrieben werden.
+"""
+
+import os
+import re
+import zipfile
+from pathlib import Path
+
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)        # kleinster im ZIP-Format darstellbarer Zeitpunkt
+FIXED_MODIFIED = "1980-01-01T00:00:00Z"  # falls die Vorlage kein dcterms:created hat
+FIRST_ENTRIES = ("[Content_Types].xml", "_rels/.rels")
+STYLES_ENTRY = "xl/styles.xml"
+
+_CREATED_RE = re.compile(rb"<dcterms:created[^>]*>([^<]*)</dcterms:created>")
+_MODIFIED_RE = re.compile(rb"(<dcterms:modified[^>]*>)[^<]*(</dcterms:modified>)")
+_SHEET_RE = re.compile(r"xl/worksheets/sheet(\d+)\.xml$")
+_BORDERS_RE = re.compile(rb"<borders\b[^>]*>(.*?)</borders>", re.S)
+_BORDER_RE = re.compile(rb"<border\b[^>]*?(?:/>|>.*?</border>)", re.S)
+_EMPTY_SIDE_RE = re.compile(rb"<(?:left|right|top|bottom|diagonal|vertical|horizontal|start|end)\s*/>")
+_EMPTY_BORDER_RE = re.compile(rb"<border\b([^>]*?)\s*>\s*</border>")
+_XFS_RE = {section: re.compile(rb"<" + section + rb"\b[^>]*>(.*?)</" + section + rb">", re.S)
+           for section in (b"cellStyleXfs", b"cellXfs")}
+_XF_RE = re.compile(rb"<xf\b[^>]*?(?:/>|>.*?</xf>)", re.S)
+_BORDER_ID_RE = re.compile(rb'borderId="(\d+)"')
+# Verweise auf Zellformate: s="n" in <c> und <row>, style="n" in <col>
+_STYLE_REF_RE = re.compile(rb'(<(?:c|row)\b[^>]*?\ss="|<col\b[^>]*?\sstyle=")(\d+)"')
+_MERGE_CELLS_RE = re.compile(rb"(<mergeCells\b[^>]*>)(.*?)(</mergeCells>)", re.S)
+_MERGE_CELL_RE = re.compile(rb"<mergeCell\b[^>]*?/>")
+_MERGE_REF_RE = re.compile(rb'ref="([A-Z]+)(\d+)')
+
+
+def stable_core_properties(data):
+    """Setzt dcterms:modified auf dcterms:created (stammt aus der Vorlage, also stabil)."""
+    created = _CREATED_RE.search(data)
+    stamp = created.group(1) if created else FIXED_MODIFIED.encode()
+    return _MODIFIED_RE.sub(lambda m: m.group(1) + stamp + m.group(2), data)
+
+
+def entry_order(name):
+    return (FIRST_ENTRIES.index(name) if name in FIRST_ENTRIES else len(FIRST_ENTRIES), name)
+
+
+def _normalize_border(border):
+    """Leere Seiten (<right />) entsprechen fehlenden; beide Schreibweisen ergeben denselben Rahmen."""
+    return _EMPTY_BORDER_RE.sub(rb"<border\1 />", _EMPTY_SIDE_RE.sub(b"", border))
+
+
+def canonical_styles(styles, sheets):
+    """
+    Nummeriert Rahmen und Zellformate (cellXfs) in styles.xml in der Reihenfolge
+    ihrer ersten Verwendung in den Blättern (sheets: Blatt-XML in Arbeitsmappen-
+    Reihenfolge) neu, gleiche Einträge werden zusammengefasst und unbenutzte
+    entfallen. Die Nummern hängen damit nur noch vom Inhalt ab, nicht davon, wie
+    openpyxl die Stile angelegt hat (z.B. nach dem Laden eines Checkpoints, das
+    zusammengeführte Bereiche neu formatiert). Gibt (styles, {alt: neu}) zurück.
+    """
+    borders_match, xfs_match = _BORDERS_RE.search(styles), _XFS_RE[b"cellXfs"].search(styles)
+    if not (borders_match and xfs_match):
+        return styles, {}
+    borders = [_normalize_border(b) for b in _BORDER_RE.findall(borders_match.group(1))]
+    xfs = _XF_RE.findall(xfs_match.group(1))
+
+    used, seen = [0], {0}           # Format 0 bleibt das Standardformat
+    for data in sheets:
+        for match in _STYLE_REF_RE.finditer(data):
+            index = int(match.group(2))
+            if index not in seen and index < len(xfs):
+                seen.add(index)
+                used.append(index)
+
+    new_borders, border_ids = [], {}
+
+    def renumber_border(xf):
+        match = _BORDER_ID_RE.search(xf)
+        if not match or int(match.group(1)) >= len(borders):
+            return xf
+        border = borders[int(match.group(1))]
+        if border not in border_ids:
+            border_ids[border] = len(new_borders)
+            new_borders.append(border)
+        return xf[:match.start(1)] + str(border_ids[border]).encode() + xf[match.end(1):]
+
+    # Vorlagen-Formate (cellStyleXfs) zuerst, damit ihr Rahmen vorne bleibt
+    style_xfs_match = _XFS_RE[b"cellStyleXfs"].search(styles)
+    style_xfs = [renumber_border(xf) for xf in _XF_RE.findall(style_xfs_match.group(1))] if style_xfs_match else []
+
+    new_xfs, xf_ids, mapping = [], {}, {}
+    for old in used:
+        xf = renumber_border(xfs[old])
+        # Zellen mit ausdrücklichem Format behalten es, auch wenn es dem Standard gleicht
+        key = None if old == 0 else xf
+        if key not in xf_ids:
+            xf_ids[key] = len(new_xfs)
+            new_xfs.append(xf)
+        mapping[old] = xf_ids[key]
+
+    sections = [(borders_match, b"borders", new_borders), (xfs_match, b"cellXfs", new_xfs)]
+    if style_xfs_match:
+        sections.append((style_xfs_match, b"cellStyleXfs", style_xfs))
+    for match, tag, entries in sorted(sections, key=lambda section: section[0].start(), reverse=True):
+        section = b'<%s count="%d">%s</%s>' % (tag, len(entries), b"".join(entries), tag)
+        styles = styles[:match.start()] + section + styles[match.end():]
+    return styles, mapping
+
+
+def _merge_order(merge_cell):
+    column, row = _MERGE_REF_RE.search(merge_cell).groups()
+    return int(row), len(column), column
+
+
+def canonical_sheet(data, mapping):
+    """
+    Setzt die Verweise eines Blatts auf Zellformate gemäss canonical_styles um und
+    sortiert die zusammengeführten Bereiche nach Zeile und Spalte (openpyxl schreibt
+    sie in der Reihenfolge eines Sets, die vom Verlauf des Einfügens abhängt).
+    """
+    if mapping:
+        data = _STYLE_REF_RE.sub(
+            lambda m: m.group(1) + str(mapping.get(int(m.group(2)), int(m.group(2)))).encode() + b'"', data)
+    return _MERGE_CELLS_RE.sub(
+        lambda m: m.group(1) + b"".join(sorted(_MERGE_CELL_RE.findall(m.group(2)), key=_merge_order)) + m.group(3),
+        data)
+
+
+def make_reproducible(xlsx_path, output_path=None):
+    """Schreibt die Arbeitsmappe deterministisch neu (ohne output_path: an Ort und Stelle)."""
+    xlsx_path = Path(xlsx_path)
+    output_path = Path(output_path) if output_path else xlsx_path
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+
+    make_reproducible_stream(xlsx_path, tmp_path)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def make_reproducible_stream(src, dst):
+    """Wie make_reproducible, von src nach dst (Pfade oder Datei-Objekte, z.B. io.BytesIO)."""
+    with zipfile.ZipFile(src) as src_zip, \
+            zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as dst_zip:
+        names = sorted(src_zip.namelist(), key=entry_order)
+        sheets = sorted((n for n in names if _SHEET_RE.match(n)), key=lambda n: int(_SHEET_RE.match(n).group(1)))
+        styles, mapping = None, {}
+        if STYLES_ENTRY in names:
+            styles, mapping = canonical_styles(src_zip.read(STYLES_ENTRY), (src_zip.read(n) for n in sheets))
+        for name in names:
+            data = src_zip.read(name)
+            if name == "docProps/core.xml":
+                data = stable_core_properties(data)
+            elif name == STYLES_ENTRY:
+                data = styles
+            elif _SHEET_RE.match(name):
+                data = canonical_sheet(data, mapping)
+            info = zipfile.ZipInfo(name, date_time=ZIP_EPOCH)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.create_system = 0
+            info.external_attr = 0
+            dst_zip.writestr(info, data, compresslevel=6)
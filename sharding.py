@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Aufgeteilte Ausgabe (generate --shard-rows / --shard-mb).
+
+Ab einigen tausend Kreditoren wird eine einzige Arbeitsmappe zu gross zum
+Öffnen und Versenden, eine Datei je Kreditor ergibt zu viele Dateien. Die
+Kreditoren werden deshalb in der Ausgabereihenfolge (alphabetisch nach Name)
+auf mehrere Arbeitsmappen ("Shards") verteilt, jede mit einem zusammen-
+hängenden Namensbereich und höchstens einem Budget an Rechnungszeilen bzw.
+geschätzter Dateigrösse:
+
+    Beilage_Verfuegung_per_Kreditor_001.xlsx   (z.B. "4B AG" bis "Frei AG")
+    Beilage_Verfuegung_per_Kreditor_002.xlsx   ...
+    Beilage_Verfuegung_per_Kreditor_Index.xlsx (Kreditor-Nr. -> Datei und Blatt)
+
+Die Shards werden in mehreren Prozessen gleichzeitig geschrieben. Ein
+Kreditor, der allein das Budget überschreitet, erhält einen eigenen Shard
+(mit --max-rows zusätzlich auf Fortsetzungsblätter verteilt).
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from progress_events import ProgressReporter, WARNING
+from PythonApplication4 import write_workbook
+
+INDEX_SUFFIX = "_Index"
+# Grobe Schätzung der komprimierten Grösse (gemessen mit shared strings): Blatt inkl. Kopf und Stilen, je Zeile
+SHEET_BYTES = 900
+ROW_BYTES = 40
+INDEX_COLUMNS = [("Kreditor-Nr.", 16), ("Kreditor", 40), ("Datei", 44), ("Blatt", 32), ("Zeilen", 10)]
+SHARD_COLUMNS = [("Datei", 44), ("Von", 40), ("Bis", 40), ("Kreditoren", 12), ("Zeilen", 10)]
+
+
+def estimated_bytes(doc, max_rows=0):
+    """Geschätzte Grösse der Beilage in der gespeicherten Arbeitsmappe."""
+    sheets = -(-len(doc) // max_rows) if max_rows > 0 and len(doc) else 1
+    return sheets * SHEET_BYTES + (len(doc) + len(doc.reasons)) * ROW_BYTES
+
+
+def shard_path(output_xlsx, number):
+    output_xlsx = Path(output_xlsx)
+    return output_xlsx.with_name(f"{output_xlsx.stem}_{number:03d}{output_xlsx.suffix}")
+
+
+def index_path(output_xlsx):
+    output_xlsx = Path(output_xlsx)
+    return output_xlsx.with_name(f"{output_xlsx.stem}{INDEX_SUFFIX}{output_xlsx.suffix}")
+
+
+def plan_shards(docs, shard_rows=None, shard_bytes=None, split_rows=0):
+    """
+    Verteilt die Beilagen (in Ausgabereihenfolge) fortlaufend auf Shards und
+    liefert je Shard die Liste seiner Beilagen, sobald er voll ist.
+    shard_rows: Budget an Rechnungszeilen, shard_bytes: Budget an geschätzten Bytes
+    (None = ohne); split_rows wie max_rows von generate (Fortsetzungsblätter).
+    """
+    shard, rows, size = [], 0, 0
+    for doc in docs:
+        doc_bytes = estimated_bytes(doc, split_rows)
+        full = (shard_rows is not None and rows + len(doc) > shard_rows) or \
+               (shard_bytes is not None and size + doc_bytes > shard_bytes)
+        if shard and full:
+            yield shard
+            shard, rows, size = [], 0, 0
+        shard.append(doc)
+        rows += len(doc)
+        size += doc_bytes
+    if shard:
+        yield shard
+
+
+def _write_shard(job):
+    """Schreibt einen Shard (läuft in einem eigenen Prozess). Gibt Blattnamen und Warnungen zurück."""
+    path, docs, template_xlsx, options = job
+    events = []
+    titles = write_workbook(docs, template_xlsx, path, ProgressReporter([events.append]), **options)
+    warnings = [(e["message"], e.get("supplier")) for e in events if e["event"] == WARNING]
+    return path, titles, warnings
+
+
+def write_index(path, entries, shards, deterministic=False):
+    """
+    Index-Arbeitsmappe: Blatt 'Index' (Kreditor -> Datei und Blatt) und Blatt 'Dateien' (Namensbereiche).
+    deterministic: wie die Shards byte-identisch zwischen gleichen Läufen schreiben
+    """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    wb = Workbook()
+    sheets = [(wb.active, "Index", INDEX_COLUMNS, entries), (wb.create_sheet(), "Dateien", SHARD_COLUMNS, shards)]
+    for ws, title, columns, rows in sheets:
+        ws.title = title
+        ws.append([name for name, _ in columns])
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+        for cell, (_, width) in zip(ws[1], columns):
+            ws.column_dimensions[cell.column_letter].width = width
+        for row in rows:
+            ws.append(list(row))
+        ws.freeze_panes = "A2"
+        ws.auto_filter.ref = ws.dimensions
+    if deterministic:
+        from datetime import datetime
+        from reproducible import ZIP_EPOCH, make_reproducible
+
+        # Ohne Vorlage setzt openpyxl dcterms:created auf "jetzt"; fest vorgeben
+        wb.properties.created = datetime(*ZIP_EPOCH)
+        wb.save(path)
+        make_reproducible(path)
+    else:
+        wb.save(path)
+
+
+def write_sharded(docs, template_xlsx, output_xlsx, reporter, shard_rows=None, shard_bytes=None, workers=None,
+                  **options):
+    """
+    Schreibt die Beilagen (Iterable von Dokumentmodellen, alphabetisch) auf Shards
+    neben output_xlsx und danach die Index-Arbeitsmappe. workers: gleichzeitig
+    geschriebene Shards (Standard: alle Kerne; 1 = ohne Prozesse). options gehen an
+    write_workbook (layout, max_rows, shared_strings, deterministic).
+    Gibt (Pfad des Index, Anzahl Shards) zurück.
+    """
+    if shard_rows is None and shard_bytes is None:
+        raise ValueError("Für die Aufteilung wird ein Budget (Zeilen oder Bytes) benötigt")
+    if any(budget is not None and budget <= 0 for budget in (shard_rows, shard_bytes)):
+        raise ValueError("Das Budget für die Aufteilung muss grösser als 0 sein")
+    output_xlsx = Path(output_xlsx)
+    output_xlsx.parent.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    entries, shards = [], []
+
+    def collect(shard_docs, result):
+        path, titles, warnings = result
+        for message, supplier in warnings:
+            reporter.warning(message, supplier=supplier)
+        for doc, sheet_titles in zip(shard_docs, titles):
+            entries.append((doc.header.code, doc.header.display_name, path.name, sheet_titles[0], len(doc)))
+            reporter.supplier_rendered(doc.header.code, doc.header.name, rows=len(doc))
+        shards.append((path.name, shard_docs[0].header.display_name, shard_docs[-1].header.display_name,
+                       len(shard_docs), sum(len(doc) for doc in shard_docs)))
+
+    planned = enumerate(plan_shards(docs, shard_rows, shard_bytes, options.get("max_rows", 0)), start=1)
+    jobs = ((shard_docs, (shard_path(output_xlsx, n), shard_docs, template_xlsx, options)) for n, shard_docs in planned)
+    if workers == 1:
+        for shard_docs, job in jobs:
+            collect(shard_docs, _write_shard(job))
+    else:
+        # Höchstens zwei Shards je Prozess unterwegs; Index in Ausgabereihenfolge
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for shard_docs, job in jobs:
+                pending.append((shard_docs, executor.submit(_write_shard, job)))
+                if len(pending) >= workers * 2:
+                    shard_docs, future = pending.popleft()
+                    collect(shard_docs, future.result())
+            while pending:
+                shard_docs, future = pending.popleft()
+                collect(shard_docs, future.result())
+
+    path = index_path(output_xlsx)
+    write_index(path, entries, shards, options.get("deterministic", False))
+    return path, len(shards)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Deduplizierte Texte für die Beilage-Ausgabe.
+
+openpyxl (ab 3.1) schreibt jeden Text als Inline-String direkt in das Blatt-XML.
+Wiederkehrende Begründungen, Kostenstellen-Bezeichnungen oder "Total" stehen
+dadurch hundertfach in der Datei. Dieses Modul bietet:
+
+- StringPool:          interniert gleiche Texte bereits beim Normalisieren,
+                       damit sie nur einmal im Speicher liegen
+- share_strings(path): schreibt eine gespeicherte Arbeitsmappe so um, dass alle
+                       Inline-Strings über eine einzige, deduplizierte
+                       sharedStrings-Tabelle laufen, und liefert Kennzahlen
+                       (Anzahl Textzellen, eindeutige Texte, Dedup-Quote, Grösse)
+- share_strings_stream: dasselbe zwischen Datei-Objekten (ohne Dateizugriffe)
+"""
+
+import os
+import re
+import zipfile
+from pathlib import Path
+
+SST_PART = "xl/sharedStrings.xml"
+SST_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SST_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+_INLINE_RE = re.compile(
+    rb'<c ([^>]*?)t="inlineStr"([^>]*)><is><t(?: [^>]*)?>(.*?)</t></is></c>', re.S
+)
+_WORKSHEET_RE = re.compile(r"^xl/worksheets/[^/]+\.xml$")
+
+
+class StringPool:
+    """Interniert Texte: gleiche Inhalte werden auf dasselbe str-Objekt abgebildet."""
+
+    def __init__(self):
+        self._pool = {}
+        self.requests = 0
+
+    def __call__(self, value):
+        self.requests += 1
+        return self._pool.setdefault(value, value)
+
+    def __len__(self):
+        return len(self._pool)
+
+
+def dedup_ratio(total, unique):
+    """Anteil eingesparter Texte (0.0 = keine Wiederholung)."""
+    return 1.0 - unique / total if total else 0.0
+
+
+def share_strings(xlsx_path, output_path=None):
+    """
+    Ersetzt alle Inline-Strings der Arbeitsmappe durch Verweise auf eine
+    gemeinsame sharedStrings-Tabelle. Ohne output_path wird die Datei ersetzt.
+    Gibt Kennzahlen als Dict zurück.
+    """
+    xlsx_path = Path(xlsx_path)
+    output_path = Path(output_path) if output_path else xlsx_path
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    size_before = xlsx_path.stat().st_size
+
+    with zipfile.ZipFile(xlsx_path) as src:
+        if SST_PART in src.namelist():
+            # Bereits mit sharedStrings geschrieben - nichts zu tun
+            if output_path != xlsx_path:
+                with open(xlsx_path, "rb") as f_in, open(output_path, "wb") as f_out:
+                    f_out.write(f_in.read())
+            return {"string_cells": None, "unique_strings": None, "dedup_ratio": None,
+                    "bytes_before": size_before, "bytes_after": size_before}
+
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as dst:
+            cells, unique = _share_entries(src, dst)
+
+    os.replace(tmp_path, output_path)
+    return {
+        "string_cells": cells,
+        "unique_strings": unique,
+        "dedup_ratio": round(dedup_ratio(cells, unique), 4),
+        "bytes_before": size_before,
+        "bytes_after": output_path.stat().st_size,
+    }
+
+
+def share_strings_stream(src, dst):
+    """
+    Wie share_strings, aber zwischen Datei-Objekten (z.B. io.BytesIO), ohne
+    Dateizugriffe. Gibt Kennzahlen als Dict zurück (ohne Grössen).
+    """
+    with zipfile.ZipFile(src) as src_zip:
+        if SST_PART in src_zip.namelist():
+            src.seek(0)
+            dst.write(src.read())
+            return {"string_cells": None, "unique_strings": None, "dedup_ratio": None}
+        with zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as dst_zip:
+            cells, unique = _share_entries(src_zip, dst_zip)
+    return {"string_cells": cells, "unique_strings": unique, "dedup_ratio": round(dedup_ratio(cells, unique), 4)}
+
+
+def _share_entries(src, dst):
+    """Kopiert alle Einträge von src nach dst (ZipFile) mit sharedStrings statt Inline-Strings."""
+    index = {}
+    order = []
+    cells = 0
+
+    def to_shared(match):
+        nonlocal cells
+        text = match.group(3)
+        idx = index.get(text)
+        if idx is None:
+            idx = index[text] = len(order)
+            order.append(text)
+        cells += 1
+        return b'<c %st="s"%s><v>%d</v></c>' % (match.group(1), match.group(2), idx)
+
+    for info in src.infolist():
+        data = src.read(info.filename)
+        if _WORKSHEET_RE.match(info.filename):
+            data = _INLINE_RE.sub(to_shared, data)
+        elif info.filename == "[Content_Types].xml":
+            data = data.replace(
+                b"</Types>",
+                b'<Override PartName="/%s" ContentType="%s" /></Types>'
+                % (SST_PART.encode(), SST_CONTENT_TYPE.encode()),
+            )
+        elif info.filename == "xl/_rels/workbook.xml.rels":
+            data = data.replace(
+                b"</Relationships>",
+                b'<Relationship Type="%s" Target="sharedStrings.xml" Id="rIdSharedStrings" />'
+                b"</Relationships>" % SST_REL_TYPE.encode(),
+            )
+        dst.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED)
+
+    with dst.open(SST_PART, "w") as sst:
+        sst.write(
+            b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+            b' count="%d" uniqueCount="%d">' % (cells, len(order))
+        )
+        for text in order:
+            sst.write(b'<si><t xml:space="preserve">%s</t></si>' % text)
+        sst.write(b"</sst>")
+    return cells, len(order)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite-Zwischenspeicher (Staging) für grosse Verfahren.
+
+Mit `generate --staging-db fall.sqlite` (oder `stage`) wird die normalisierte
+Kontierung zusammen mit dem NA15-Register einmal in eine lokale SQLite-Datenbank
+geladen, mit Indizes auf Kreditor-Code, normalisierte ER-Nr. und Code. Beim
+Rendern liest der Generator je Kreditor nur dessen Zeilen und NA15-Begründungen
+über indizierte Abfragen; der Speicherbedarf hängt damit nicht mehr von der
+Grösse des Falls ab.
+
+Die Datenbank merkt sich den Fingerabdruck von Eingabe und NA15-Register und
+wird wiederverwendet, solange sich beide nicht ändern. Zwischen den Läufen
+beantwortet `lookup` gezielte Fragen ("alle ERs von Kreditor X") sofort; die
+Tabellen 'kontierung' und 'na15' lassen sich auch mit jedem SQLite-Werkzeug
+abfragen (Spaltennamen wie in der Eingabe).
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+
+from checkpoint import file_fingerprint
+from input_adapters import na15_path
+from PythonApplication4 import (
+    COL_SUP_CODE, COL_SUP_NAME, COL_SUP_CITY, COL_SUP_EXT, COL_ER, COL_AMOUNT, COL_CC, COL_CODE, COL_REASON,
+    map_cost_center, norm_code, norm_er,
+)
+
+SCHEMA_VERSION = "2"
+ROWS_TABLE = "kontierung"
+NA15_TABLE = "na15"
+STAGED_COLUMNS = [COL_SUP_CODE, COL_SUP_NAME, COL_SUP_CITY, COL_SUP_EXT, COL_ER, COL_AMOUNT, COL_CC, COL_CODE, COL_REASON]
+BATCH_ROWS = 10_000
+
+# Zusatzspalten: Position in der Eingabe, normalisierter Kreditor-Code und normalisierte ER-Nr.
+POS, SUPPLIER_KEY, ER_KEY = "pos", "supplier_key", "er_norm"
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def input_fingerprint(input_path):
+    """Fingerabdruck von Eingabe und NA15-Register (bei XLSX dieselbe Datei)."""
+    input_path = Path(input_path)
+    return f"{SCHEMA_VERSION}|{file_fingerprint(input_path)}|{file_fingerprint(na15_path(input_path))}"
+
+
+class StagedNA15:
+    """NA15-Register aus der Datenbank, abfragbar wie das Dict aus load_na15_index_exact."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, key, default=None):
+        name, er = key
+        rows = self.store.conn.execute(
+            f"SELECT reason FROM {NA15_TABLE} WHERE name = ? AND {ER_KEY} = ? ORDER BY seq", (name, er)
+        ).fetchall()
+        return [reason for (reason,) in rows] or default
+
+
+class StagingStore:
+    """
+    Staging-Datenbank eines Falls. Jeder Thread erhält eine eigene Verbindung,
+    damit die Stufe Aufbereiten von --pipeline parallel lesen kann; close()
+    schliesst die Verbindungen aller Threads (sonst bleibt die Datei z.B. unter
+    Windows gesperrt, bis der Garbage Collector sie aufräumt).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.na15 = StagedNA15(self)
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False: close() schliesst auch Verbindungen anderer Threads
+            conn = self._local.conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def fingerprint(self):
+        """Fingerabdruck der geladenen Eingabe, None bei fehlender, leerer oder fremder Datenbank."""
+        if not self.path.exists():
+            return None  # nicht verbinden: sqlite3.connect würde eine leere Datei anlegen
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        except sqlite3.DatabaseError:
+            return None
+        return row[0] if row else None
+
+    def load(self, df, na15_index, fingerprint):
+        """Ersetzt den Inhalt durch die normalisierte Kontierung df und das NA15-Register."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self.conn
+        columns = [POS, SUPPLIER_KEY, ER_KEY] + STAGED_COLUMNS
+        placeholders = ", ".join("?" * len(columns))
+        values = [df[c] if c in df.columns else [""] * len(df) for c in STAGED_COLUMNS]
+        keys = df[COL_SUP_CODE].map(norm_code)
+        ers = df[COL_ER].map(norm_er)
+
+        with conn:
+            for table in ("meta", ROWS_TABLE, NA15_TABLE):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                f"CREATE TABLE {ROWS_TABLE} ({POS} INTEGER PRIMARY KEY, {SUPPLIER_KEY} TEXT, {ER_KEY} TEXT, "
+                + ", ".join(f"{_q(c)} {'REAL' if c == COL_AMOUNT else 'TEXT'}" for c in STAGED_COLUMNS) + ")"
+            )
+            conn.execute(f"CREATE TABLE {NA15_TABLE} (name TEXT, {ER_KEY} TEXT, seq INTEGER, reason TEXT)")
+
+            rows = zip(range(len(df)), keys, ers, *values)
+            insert = f"INSERT INTO {ROWS_TABLE} VALUES ({placeholders})"
+            while True:
+                batch = [tuple(r) for _, r in zip(range(BATCH_ROWS), rows)]
+                if not batch:
+                    break
+                conn.executemany(insert, batch)
+            conn.executemany(
+                f"INSERT INTO {NA15_TABLE} VALUES (?, ?, ?, ?)",
+                ((name, er, seq, reason)
+                 for (name, er), reasons in na15_index.items() for seq, reason in enumerate(reasons)),
+            )
+
+            # Indizes erst nach dem Laden anlegen (schneller als beim Einfügen nachführen)
+            conn.execute(f"CREATE INDEX idx_{ROWS_TABLE}_supplier ON {ROWS_TABLE} ({SUPPLIER_KEY}, {POS})")
+            conn.execute(f"CREATE INDEX idx_{ROWS_TABLE}_er ON {ROWS_TABLE} ({ER_KEY})")
+            conn.execute(f"CREATE INDEX idx_{ROWS_TABLE}_code ON {ROWS_TABLE} ({_q(COL_CODE)} COLLATE NOCASE)")
+            conn.execute(f"CREATE INDEX idx_{NA15_TABLE}_key ON {NA15_TABLE} (name, {ER_KEY}, seq)")
+            conn.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        conn.execute("ANALYZE")
+
+    def row_count(self):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {ROWS_TABLE}").fetchone()[0]
+
+    def suppliers(self, keys=None):
+        """
+        Kreditoren wie list_suppliers: je Code die erste Zeile, sortiert nach Name und Code.
+        keys: nur diese normalisierten Kreditor-Codes (None = alle)
+        """
+        cols = [COL_SUP_CODE, COL_SUP_NAME, COL_SUP_CITY]
+        query = (
+            f"SELECT {', '.join(_q(c) for c in cols)}, {SUPPLIER_KEY} FROM {ROWS_TABLE} "
+            f"WHERE {POS} IN (SELECT MIN({POS}) FROM {ROWS_TABLE} GROUP BY {_q(COL_SUP_CODE)}) "
+            f"ORDER BY {_q(COL_SUP_NAME)}, {_q(COL_SUP_CODE)}"
+        )
+        return [dict(zip(cols, row[:-1])) for row in self.conn.execute(query)
+                if keys is None or row[-1] in keys]
+
+    def rows(self, code):
+        """Alle Zeilen eines Kreditors in Eingabereihenfolge als DataFrame (indizierte Abfrage)."""
+        import pandas as pd
+
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(_q(c) for c in STAGED_COLUMNS)} FROM {ROWS_TABLE} "
+            f"WHERE {SUPPLIER_KEY} = ? ORDER BY {POS}", (norm_code(code),)
+        )
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=STAGED_COLUMNS)
+
+    def select(self, codes, filters):
+        """
+        Normalisierte Codes der Kreditoren für --only (wie select_rows): Codes direkt,
+        Filter wählen Kreditoren mit mindestens einer passenden Zeile.
+        """
+        keys = {row[0] for row in self.conn.execute(f"SELECT DISTINCT {SUPPLIER_KEY} FROM {ROWS_TABLE}")}
+        selected = {c for c in codes if c in keys}
+        for column, wanted in filters:
+            if column not in STAGED_COLUMNS:
+                raise ValueError(f"Unbekanntes Feld für --only: {column} (in der Staging-Datenbank: "
+                                 f"{', '.join(STAGED_COLUMNS)})")
+            query = f"SELECT DISTINCT {SUPPLIER_KEY}, {_q(column)} FROM {ROWS_TABLE}"
+            for key, value in self.conn.execute(query):
+                value = str(value if value is not None else "").strip()
+                if column in (COL_SUP_CODE, COL_CC):
+                    value = norm_code(value)
+                hit = value.lower() in wanted
+                if column == COL_CC:
+                    hit = hit or map_cost_center(value).lower() in wanted
+                if hit:
+                    selected.add(key)
+        return selected
+
+    def lookup(self, supplier=None, er=None, code=None):
+        """
+        Gezielte Abfrage: Zeilen eines Kreditors, einer ER-Nr. und/oder eines Codes,
+        jeweils mit den NA15-Begründungen der ER. Gibt eine Liste von Dicts zurück.
+        """
+        where, params = [], []
+        if supplier:
+            where.append(f"k.{SUPPLIER_KEY} = ?")
+            params.append(norm_code(supplier))
+        if er:
+            where.append(f"k.{ER_KEY} = ?")
+            params.append(norm_er(er))
+        if code:
+            where.append(f"k.{_q(COL_CODE)} = ? COLLATE NOCASE")  # nutzt idx_kontierung_code
+            params.append(code.strip())
+        query = (
+            f"SELECT {', '.join('k.' + _q(c) for c in STAGED_COLUMNS)}, "
+            f"(SELECT GROUP_CONCAT(reason, ' | ') FROM (SELECT n.reason FROM {NA15_TABLE} n "
+            f"WHERE n.name = k.{_q(COL_SUP_NAME)} AND n.{ER_KEY} = k.{ER_KEY} ORDER BY n.seq)) "
+            f"FROM {ROWS_TABLE} k"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + f" ORDER BY k.{_q(COL_SUP_NAME)}, k.{POS}"
+        )
+        return [dict(zip(STAGED_COLUMNS + ["NA15"], row)) for row in self.conn.execute(query, params)]
+
+    def close(self):
+        """Schliesst die Verbindungen aller Threads; danach verbindet conn neu."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()